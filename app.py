@@ -8,9 +8,13 @@ Run with: streamlit run app.py
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import io
+import itertools
+import re
+import xlsxwriter
 
 # Import database operations
 from database import (
@@ -33,6 +37,9 @@ st.set_page_config(
 # HELPER FUNCTIONS
 # ============================================================================
 
+MANAGEMENT_TASK = re.compile(r'PM|MANAGEMENT')
+DRAFTING_TASK = re.compile(r'DF|DRAFT|3D')
+
 def parse_time_to_hours(time_str):
     """Convert HH:MM:SS to decimal hours"""
     try:
@@ -49,6 +56,17 @@ def parse_time_to_hours(time_str):
     except:
         return 0.0
 
+def parse_time_series(times):
+    """Vectorized parse_time_to_hours for a whole column"""
+    parts = times.astype(str).str.split(':', expand=True)
+    present = parts.notna()
+    values = parts.apply(pd.to_numeric, errors='coerce')
+    hours = pd.Series(0.0, index=times.index)
+    for i, scale in enumerate([1.0, 60.0, 3600.0][:parts.shape[1]]):
+        hours = hours + values[i].where(present[i], 0.0) / scale
+    # Malformed entries (bad parts, more than H:M:S) count as zero, as before
+    return hours.where(present.sum(axis=1) <= 3, 0.0).fillna(0.0)
+
 def calculate_week_ending(date_obj):
     """Get next Saturday"""
     if isinstance(date_obj, str):
@@ -58,6 +76,12 @@ def calculate_week_ending(date_obj):
         days = 7
     return date_obj + timedelta(days=days)
 
+def calculate_week_ending_series(dates):
+    """Vectorized calculate_week_ending for a datetime column"""
+    days = (5 - dates.dt.weekday) % 7
+    days = days.where(days != 0, 7)
+    return dates + pd.to_timedelta(days, unit='D')
+
 def map_function(task_name):
     """Map task name to function"""
     if pd.isna(task_name):
@@ -69,6 +93,101 @@ def map_function(task_name):
         return "DRAFTING"
     return "ENGINEERING"
 
+def map_function_series(task_names):
+    """Vectorized map_function for a whole column"""
+    tasks = task_names.fillna('').astype(str).str.upper()
+    functions = np.where(tasks.str.contains(MANAGEMENT_TASK), "MANAGEMENT",
+                         np.where(tasks.str.contains(DRAFTING_TASK), "DRAFTING", "ENGINEERING"))
+    return pd.Series(functions, index=task_names.index)
+
+def calculate_earned_hours(delivs):
+    """Total earned hours - manual override or budget x progress"""
+    manual = delivs['manual_progress_override'].to_numpy(dtype=bool)
+    earned = np.where(manual, delivs['earned_hours'].to_numpy(),
+                      delivs['budget_hours'].to_numpy() * delivs['physical_progress'].to_numpy() / 100.0)
+    return float(earned.sum())
+
+# ============================================================================
+# CACHED DATA ACCESS
+# ============================================================================
+
+@st.cache_data(ttl=60)
+def load_projects(status='active', columns=None):
+    """Project list, cached across reruns"""
+    return ProjectDB.get_all_projects(status, columns=columns)
+
+@st.cache_data(ttl=60)
+def load_project_options():
+    """Active project ids mapped to sidebar labels"""
+    projects = ProjectDB.get_all_projects('active', columns=['id', 'name', 'client'])
+    labels = projects['name'].astype(str) + ' - ' + projects['client'].astype(str)
+    return dict(zip(projects['id'].tolist(), labels))
+
+@st.cache_data(ttl=60)
+def load_project(project_id):
+    """Single project row, cached across reruns"""
+    return ProjectDB.get_project(project_id)
+
+@st.cache_data(ttl=60)
+def load_deliverables(project_id, columns=None):
+    """Project deliverables, cached across reruns"""
+    return DeliverableDB.get_deliverables(project_id, columns=columns)
+
+@st.cache_data(ttl=60)
+def load_change_orders(project_id, columns=None):
+    """Project change orders, cached across reruns"""
+    return ChangeOrderDB.get_change_orders(project_id, columns=columns)
+
+@st.cache_data(ttl=60)
+def load_purchase_orders(project_id, columns=None):
+    """Project purchase orders, cached across reruns"""
+    return PODB.get_purchase_orders(project_id, columns=columns)
+
+@st.cache_data(ttl=60)
+def load_manning_forecast(project_id):
+    """Project manning forecast, cached across reruns"""
+    return ManningDB.get_manning_forecast(project_id)
+
+@st.cache_data(ttl=60)
+def load_invoices(project_id):
+    """Invoices across the project's POs, cached across reruns"""
+    return InvoiceDB.get_invoices(project_id=project_id)
+
+@st.cache_data(ttl=60)
+def load_commentary(project_id, week_ending):
+    """Weekly commentary row, cached across reruns"""
+    return CommentaryDB.get_commentary(project_id, week_ending)
+
+@st.cache_data(ttl=30)
+def load_forecast_reconciliation(project_id):
+    """Deliverable vs manning FTC, cached across reruns"""
+    return ManningDB.get_forecast_reconciliation(project_id)
+
+@st.cache_data(ttl=30)
+def _dashboard_payload(project_id):
+    """Dashboard totals and chart data, or None without deliverables"""
+    delivs = DeliverableDB.get_deliverables(project_id, columns=[
+        'function', 'status', 'budget_hours', 'physical_progress',
+        'manual_progress_override', 'earned_hours', 'forecast_to_complete'
+    ])
+    if delivs.empty:
+        return None
+    
+    actuals = TimesheetDB.get_timesheets(project_id, columns=['hours', 'cost'])
+    by_func = delivs.groupby('function').agg({
+        'budget_hours': 'sum',
+        'physical_progress': 'mean'
+    }).reset_index()
+    return (
+        float(delivs['budget_hours'].sum()),
+        calculate_earned_hours(delivs),
+        float(delivs['forecast_to_complete'].sum()),
+        float(actuals['hours'].sum()) if not actuals.empty else 0.0,
+        float(actuals['cost'].sum()) if not actuals.empty else 0.0,
+        by_func,
+        delivs['status'].value_counts(),
+    )
+
 # ============================================================================
 # SESSION STATE
 # ============================================================================
@@ -82,26 +201,18 @@ if 'current_project_id' not in st.session_state:
 
 def show_project_selector():
     """Project selector in sidebar"""
-    projects = ProjectDB.get_all_projects('active')
+    project_options = load_project_options()
     
-    if not projects.empty:
-        project_options = {f"{p['name']} - {p['client']}": p['id'] 
-                          for _, p in projects.iterrows()}
+    if project_options:
+        ids = list(project_options)
+        current = st.session_state.current_project_id
         
-        if project_options:
-            current_name = None
-            if st.session_state.current_project_id:
-                for name, pid in project_options.items():
-                    if pid == st.session_state.current_project_id:
-                        current_name = name
-                        break
-            
-            selected = st.sidebar.selectbox(
-                "📁 Active Project",
-                list(project_options.keys()),
-                index=list(project_options.keys()).index(current_name) if current_name else 0
-            )
-            st.session_state.current_project_id = project_options[selected]
+        st.session_state.current_project_id = st.sidebar.selectbox(
+            "📁 Active Project",
+            ids,
+            index=ids.index(current) if current in project_options else 0,
+            format_func=project_options.get
+        )
     else:
         st.sidebar.warning("No active projects")
         st.session_state.current_project_id = None
@@ -110,6 +221,7 @@ def show_project_selector():
 # PAGE: PROJECTS
 # ============================================================================
 
+@st.fragment
 def page_projects():
     """Project management page"""
     st.title("📁 Projects")
@@ -159,6 +271,8 @@ def page_projects():
                             contract_value=contract_value,
                             contingency_pct=contingency
                         )
+                        load_projects.clear()
+                        load_project_options.clear()
                         st.success(f"✅ Project created!")
                         st.session_state.current_project_id = pid
                         st.session_state.show_create_project = False
@@ -173,12 +287,12 @@ def page_projects():
     
     # Show existing projects
     st.divider()
-    projects = ProjectDB.get_all_projects('active')
+    projects = load_projects('active', ['project_code', 'name', 'client', 'project_type',
+                                        'start_date', 'end_date', 'status'])
     
     if not projects.empty:
         st.dataframe(
-            projects[['project_code', 'name', 'client', 'project_type', 
-                     'start_date', 'end_date', 'status']],
+            projects,
             use_container_width=True,
             hide_index=True
         )
@@ -189,6 +303,33 @@ def page_projects():
 # PAGE: DELIVERABLES
 # ============================================================================
 
+@st.fragment
+def show_budget_rollup(edited):
+    """Budget rollup by function and discipline"""
+    st.subheader("Budget Rollup")
+    
+    # One grouping pass; dropna=False keeps rows missing only one of the keys
+    rollup = edited.groupby(['function', 'discipline'], dropna=False)['budget_hours'].sum()
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("**By Function**")
+        by_function = rollup.groupby(level='function').sum().reset_index()
+        st.dataframe(by_function, hide_index=True)
+    
+    with col2:
+        st.markdown("**By Discipline**")
+        by_disc = rollup.groupby(level='discipline').sum().reset_index()
+        st.dataframe(by_disc, hide_index=True)
+
+DELIVERABLE_EDIT_COLUMNS = [
+    'id', 'wbs_code', 'deliverable_name', 'discipline', 'function',
+    'budget_hours', 'status', 'physical_progress',
+    'manual_progress_override', 'earned_hours', 'forecast_to_complete'
+]
+
+@st.fragment
 def page_deliverables():
     """Deliverable management with earned value"""
     st.title("📋 Deliverables & Budget")
@@ -197,11 +338,11 @@ def page_deliverables():
         st.warning("Select a project first")
         return
     
-    project = ProjectDB.get_project(st.session_state.current_project_id)
+    project = load_project(st.session_state.current_project_id)
     st.markdown(f"### {project['name']}")
     
     # Get deliverables
-    delivs = DeliverableDB.get_deliverables(st.session_state.current_project_id)
+    delivs = load_deliverables(st.session_state.current_project_id, DELIVERABLE_EDIT_COLUMNS)
     
     # Summary metrics
     if not delivs.empty:
@@ -209,9 +350,7 @@ def page_deliverables():
         
         total_budget = delivs['budget_hours'].sum()
         avg_progress = delivs['physical_progress'].mean()
-        earned = delivs.apply(lambda row: 
-            row['earned_hours'] if row['manual_progress_override'] 
-            else row['budget_hours'] * row['physical_progress'] / 100.0, axis=1).sum()
+        earned = calculate_earned_hours(delivs)
         ftc = delivs['forecast_to_complete'].sum()
         
         with col1:
@@ -228,25 +367,13 @@ def page_deliverables():
     # Editable deliverables table
     st.subheader("Deliverable Details")
     
-    # Prepare dataframe for editing
-    if not delivs.empty:
-        edit_df = delivs[[
-            'wbs_code', 'deliverable_name', 'discipline', 'function',
-            'budget_hours', 'status', 'physical_progress', 
-            'manual_progress_override', 'earned_hours', 'forecast_to_complete'
-        ]].copy()
-    else:
-        edit_df = pd.DataFrame(columns=[
-            'wbs_code', 'deliverable_name', 'discipline', 'function',
-            'budget_hours', 'status', 'physical_progress', 
-            'manual_progress_override', 'earned_hours', 'forecast_to_complete'
-        ])
-    
+    # Only the editable columns are loaded, so the frame goes to the editor as-is
     edited = st.data_editor(
-        edit_df,
+        delivs,
         num_rows="dynamic",
         use_container_width=True,
         column_config={
+            "id": None,  # hidden - lets the save update rows in place
             "wbs_code": st.column_config.TextColumn("WBS", width="small"),
             "deliverable_name": st.column_config.TextColumn("Deliverable", width="large"),
             "discipline": st.column_config.SelectboxColumn("Disc",
@@ -271,30 +398,24 @@ def page_deliverables():
         if st.button("💾 Save Deliverables", type="primary"):
             DeliverableDB.bulk_update_deliverables(
                 st.session_state.current_project_id, edited)
+            load_deliverables.clear()
+            _dashboard_payload.clear()
+            load_forecast_reconciliation.clear()
             st.success("✅ Saved!")
             st.rerun()
     
     # Rollup summary
     if not edited.empty:
         st.divider()
-        st.subheader("Budget Rollup")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("**By Function**")
-            by_function = edited.groupby('function')['budget_hours'].sum().reset_index()
-            st.dataframe(by_function, hide_index=True)
-        
-        with col2:
-            st.markdown("**By Discipline**")
-            by_disc = edited.groupby('discipline')['budget_hours'].sum().reset_index()
-            st.dataframe(by_disc, hide_index=True)
+        show_budget_rollup(edited)
 
 # ============================================================================
 # PAGE: CHANGE ORDERS
 # ============================================================================
 
+CO_HOUR_COLUMNS = ['hours_mgmt', 'hours_eng', 'hours_draft']
+
+@st.fragment
 def page_change_orders():
     """Change order management"""
     st.title("📝 Change Orders")
@@ -303,7 +424,7 @@ def page_change_orders():
         st.warning("Select a project first")
         return
     
-    project = ProjectDB.get_project(st.session_state.current_project_id)
+    project = load_project(st.session_state.current_project_id)
     st.markdown(f"### {project['name']}")
     
     col1, col2 = st.columns([3, 1])
@@ -353,6 +474,8 @@ def page_change_orders():
                         hours_draft=hours_draft,
                         client_billable=1 if client_billable else 0
                     )
+                    load_change_orders.clear()
+                    _dashboard_payload.clear()
                     st.success("✅ Change order created!")
                     st.session_state.show_new_co = False
                     st.rerun()
@@ -364,10 +487,16 @@ def page_change_orders():
     
     # Show existing COs
     st.divider()
-    cos = ChangeOrderDB.get_change_orders(st.session_state.current_project_id)
+    cos = load_change_orders(st.session_state.current_project_id, [
+        'co_number', 'description', 'change_type', 'status',
+        'hours_mgmt', 'hours_eng', 'hours_draft', 'client_billable'
+    ])
     
     if not cos.empty:
         # Summary
+        hours = cos[CO_HOUR_COLUMNS].to_numpy()
+        billable_mask = cos['client_billable'].to_numpy() == 1
+        
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.metric("Total COs", len(cos))
@@ -375,23 +504,15 @@ def page_change_orders():
             approved = len(cos[cos['status'] == 'approved'])
             st.metric("Approved", approved)
         with col3:
-            total_hours = cos['hours_mgmt'] + cos['hours_eng'] + cos['hours_draft']
-            st.metric("Total Hours Impact", f"{total_hours.sum():.0f}h")
+            st.metric("Total Hours Impact", f"{np.nansum(hours):.0f}h")
         with col4:
-            billable = cos[cos['client_billable'] == 1]['hours_mgmt'] + \
-                      cos[cos['client_billable'] == 1]['hours_eng'] + \
-                      cos[cos['client_billable'] == 1]['hours_draft']
-            st.metric("Billable Hours", f"{billable.sum():.0f}h")
+            billable = np.nansum(hours[billable_mask])
+            st.metric("Billable Hours", f"{billable:.0f}h")
         
         st.divider()
         
         # Display COs
-        display_cos = cos[[
-            'co_number', 'description', 'change_type', 'status',
-            'hours_mgmt', 'hours_eng', 'hours_draft', 'client_billable'
-        ]].copy()
-        
-        st.dataframe(display_cos, use_container_width=True, hide_index=True)
+        st.dataframe(cos, use_container_width=True, hide_index=True)
     else:
         st.info("No change orders yet")
 
@@ -399,6 +520,7 @@ def page_change_orders():
 # PAGE: PURCHASE ORDERS
 # ============================================================================
 
+@st.fragment
 def page_purchase_orders():
     """PO and invoice management"""
     st.title("📦 Purchase Orders & External Costs")
@@ -445,6 +567,8 @@ def page_purchase_orders():
                             commitment_value=commitment,
                             category=category
                         )
+                        load_purchase_orders.clear()
+                        _dashboard_payload.clear()
                         st.success("✅ PO created!")
                         st.session_state.show_new_po = False
                         st.rerun()
@@ -455,18 +579,17 @@ def page_purchase_orders():
                         st.rerun()
         
         # Show POs
-        pos = PODB.get_purchase_orders(st.session_state.current_project_id)
+        pos = load_purchase_orders(st.session_state.current_project_id, [
+            'po_number', 'supplier', 'description', 'category',
+            'commitment_value', 'invoiced_to_date', 'accrued_work_done', 'status'
+        ])
         if not pos.empty:
-            st.dataframe(pos[[
-                'po_number', 'supplier', 'description', 'category',
-                'commitment_value', 'invoiced_to_date', 'accrued_work_done', 'status'
-            ]], use_container_width=True, hide_index=True)
+            st.dataframe(pos, use_container_width=True, hide_index=True)
     
     # Invoice Tab
     with tabs[1]:
         st.subheader("Invoices")
-        invoices = InvoiceDB.get_invoices(
-            project_id=st.session_state.current_project_id)
+        invoices = load_invoices(st.session_state.current_project_id)
         
         if not invoices.empty:
             st.dataframe(invoices, use_container_width=True, hide_index=True)
@@ -475,7 +598,9 @@ def page_purchase_orders():
     
     # Summary Tab
     with tabs[2]:
-        pos = PODB.get_purchase_orders(st.session_state.current_project_id)
+        pos = load_purchase_orders(st.session_state.current_project_id, [
+            'commitment_value', 'invoiced_to_date', 'accrued_work_done'
+        ])
         if not pos.empty:
             col1, col2, col3, col4 = st.columns(4)
             
@@ -493,6 +618,41 @@ def page_purchase_orders():
 # PAGE: DASHBOARD
 # ============================================================================
 
+@st.cache_resource(max_entries=32)
+def function_chart(by_func):
+    """Budget by function bar chart, reused while by_func is unchanged"""
+    fig = go.Figure(data=[
+        go.Bar(name='Budget', x=by_func['function'], y=by_func['budget_hours']),
+    ])
+    fig.update_layout(height=300)
+    return fig
+
+@st.cache_resource(max_entries=32)
+def status_chart(status_counts):
+    """Completion status pie chart, reused while status_counts is unchanged"""
+    fig = go.Figure(data=[go.Pie(labels=status_counts.index, values=status_counts.values)])
+    fig.update_layout(height=300)
+    return fig
+
+CHART_CONFIG = {'staticPlot': False, 'displayModeBar': False}
+
+@st.fragment
+def show_dashboard_charts(by_func, status_counts):
+    """Dashboard charts - reruns on its own, not with the whole page"""
+    # st.tabs would build every chart; only the selected one is built here
+    chart = st.radio("Chart", ["Progress by Function", "Completion Status"],
+                     horizontal=True, label_visibility="collapsed")
+    
+    if chart == "Progress by Function":
+        st.subheader("Progress by Function")
+        st.plotly_chart(function_chart(by_func), use_container_width=True,
+                        config=CHART_CONFIG, key="dash_func_chart")
+    else:
+        st.subheader("Completion Status")
+        st.plotly_chart(status_chart(status_counts), use_container_width=True,
+                        config=CHART_CONFIG, key="dash_status_chart")
+
+@st.fragment
 def page_dashboard():
     """Main project dashboard"""
     st.title("📊 Project Dashboard")
@@ -501,30 +661,20 @@ def page_dashboard():
         st.info("Select a project to view dashboard")
         return
     
-    project = ProjectDB.get_project(st.session_state.current_project_id)
+    project = load_project(st.session_state.current_project_id)
     
     st.markdown(f"## {project['name']} - {project['client']}")
     st.markdown(f"*{project['project_type']}*")
     
-    # Get summary data
-    summary = ProjectDB.get_project_summary(st.session_state.current_project_id)
-    delivs = DeliverableDB.get_deliverables(st.session_state.current_project_id)
+    # Totals are cached until a save elsewhere clears them
+    payload = _dashboard_payload(st.session_state.current_project_id)
     
-    if delivs.empty:
+    if payload is None:
         st.warning("No deliverables defined. Add some in the Deliverables page.")
         return
     
-    # Calculate totals
-    budget_total = delivs['budget_hours'].sum()
-    earned_total = delivs.apply(lambda row:
-        row['earned_hours'] if row['manual_progress_override']
-        else row['budget_hours'] * row['physical_progress'] / 100.0, axis=1).sum()
-    ftc_total = delivs['forecast_to_complete'].sum()
-    
-    # Get actuals
-    actuals = TimesheetDB.get_timesheets(st.session_state.current_project_id)
-    actual_hours = actuals['hours'].sum() if not actuals.empty else 0
-    actual_cost = actuals['cost'].sum() if not actuals.empty else 0
+    (budget_total, earned_total, ftc_total, actual_hours, actual_cost,
+     by_func, status_counts) = payload
     
     # Key metrics
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -545,32 +695,44 @@ def page_dashboard():
     st.divider()
     
     # Charts
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader("Progress by Function")
-        by_func = delivs.groupby('function').agg({
-            'budget_hours': 'sum',
-            'physical_progress': 'mean'
-        }).reset_index()
-        
-        fig = go.Figure(data=[
-            go.Bar(name='Budget', x=by_func['function'], y=by_func['budget_hours']),
-        ])
-        fig.update_layout(height=300)
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
-        st.subheader("Completion Status")
-        status_counts = delivs['status'].value_counts()
-        fig = go.Figure(data=[go.Pie(labels=status_counts.index, values=status_counts.values)])
-        fig.update_layout(height=300)
-        st.plotly_chart(fig, use_container_width=True)
+    show_dashboard_charts(by_func, status_counts)
 
 # ============================================================================
 # PAGE: IMPORT DATA
 # ============================================================================
 
+TIMESHEET_COLUMNS = {
+    '[Time] Date': 'date',
+    '[Staff] Name': 'staff_name',
+    '[Job Task] Name': 'task_name',
+    '[Time] Time': 'time'
+}
+IMPORT_CHUNK_ROWS = 50_000
+
+@st.cache_data(ttl=300)
+def load_staff_rates():
+    """Current charge rate per staff name - master data changes rarely"""
+    staff = MasterDataDB.get_staff()
+    position_rates = {pos: MasterDataDB.get_rate_for_position(pos)
+                      for pos in staff['position'].unique()}
+    return pd.Series(staff['position'].map(position_rates).to_numpy(), index=staff['name'])
+
+def prepare_timesheets(df, staff_rates):
+    """Map one chunk of a Workflow Max export to timesheet rows"""
+    df = df.rename(columns=TIMESHEET_COLUMNS)
+    
+    df['hours'] = parse_time_series(df['time'])
+    dates = pd.to_datetime(df['date'])
+    df['date'] = dates.dt.strftime('%Y-%m-%d')
+    df['week_ending'] = calculate_week_ending_series(dates).dt.strftime('%Y-%m-%d')
+    df['function'] = map_function_series(df['task_name'])
+    
+    df['rate'] = df['staff_name'].map(staff_rates).fillna(170.0)
+    df['cost'] = df['hours'] * df['rate']
+    df['discipline'] = ''
+    return df
+
+@st.fragment
 def page_import():
     """Import timesheet data"""
     st.title("📤 Import Timesheets")
@@ -579,56 +741,41 @@ def page_import():
         st.warning("Select a project first")
         return
     
-    project = ProjectDB.get_project(st.session_state.current_project_id)
-    st.markdown(f"### Importing to: {project['name']}")
+    project = load_project(st.session_state.current_project_id)
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown(f"### Importing to: {project['name']}")
+    with col2:
+        # Staff and rates are cached; pick up edits made outside the app
+        if st.button("🔄 Refresh Master Data"):
+            load_staff_rates.clear()
+            MasterDataDB.invalidate_caches()
     
     uploaded = st.file_uploader("Upload Workflow Max CSV", type=['csv'])
     
     if uploaded:
-        df = pd.read_csv(uploaded)
+        # Parse in chunks - the preview only needs the first one
+        reader = pd.read_csv(uploaded, usecols=lambda col: col in TIMESHEET_COLUMNS,
+                             chunksize=IMPORT_CHUNK_ROWS, dtype_backend='pyarrow')
+        first = next(reader, pd.DataFrame(columns=list(TIMESHEET_COLUMNS)))
         
         st.subheader("Preview")
-        st.dataframe(df.head(10))
+        st.dataframe(first.head(10))
         
         if st.button("Process and Import", type="primary"):
             try:
-                # Map columns
-                mapping = {
-                    '[Time] Date': 'date',
-                    '[Staff] Name': 'staff_name',
-                    '[Job Task] Name': 'task_name',
-                    '[Time] Time': 'time'
-                }
-                df = df.rename(columns=mapping)
-                
-                # Process
-                df['hours'] = df['time'].apply(parse_time_to_hours)
-                df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-                df['week_ending'] = pd.to_datetime(df['date']).apply(
-                    lambda x: calculate_week_ending(x).strftime('%Y-%m-%d'))
-                df['function'] = df['task_name'].apply(map_function)
-                
-                # Get rates
-                staff = MasterDataDB.get_staff()
-                rates = MasterDataDB.get_rates()
-                
-                def get_rate(name):
-                    staff_row = staff[staff['name'] == name]
-                    if not staff_row.empty:
-                        pos = staff_row.iloc[0]['position']
-                        return MasterDataDB.get_rate_for_position(pos)
-                    return 170.0
-                
-                df['rate'] = df['staff_name'].apply(get_rate)
-                df['cost'] = df['hours'] * df['rate']
-                df['discipline'] = ''
+                staff_rates = load_staff_rates()
+                chunks = (prepare_timesheets(chunk, staff_rates)
+                          for chunk in itertools.chain([first], reader))
                 
-                # Import
+                # Import - all chunks go in as one batch
                 batch_id = datetime.now().strftime('%Y%m%d-%H%M%S')
-                TimesheetDB.import_timesheets(
-                    st.session_state.current_project_id, df, batch_id)
+                imported = TimesheetDB.import_timesheets(
+                    st.session_state.current_project_id, chunks, batch_id)
+                _dashboard_payload.clear()
                 
-                st.success(f"✅ Imported {len(df)} entries!")
+                st.success(f"✅ Imported {imported} entries!")
                 
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -637,6 +784,7 @@ def page_import():
 # PAGE: MANNING FORECAST
 # ============================================================================
 
+@st.fragment
 def page_manning():
     """Manning forecast grid"""
     st.title("📅 Manning Forecast")
@@ -649,7 +797,7 @@ def page_manning():
     st.markdown("This page shows weekly resource loading forecast")
     
     # Get manning data
-    manning = ManningDB.get_manning_forecast(st.session_state.current_project_id)
+    manning = load_manning_forecast(st.session_state.current_project_id)
     
     if not manning.empty:
         st.dataframe(manning)
@@ -660,6 +808,61 @@ def page_manning():
 # PAGE: REPORTS
 # ============================================================================
 
+REPORT_CHUNK_ROWS = 50_000
+
+def write_sheet(workbook, name, df):
+    """Write a frame, or an iterable of frame chunks, row by row - constant_memory needs rows in order"""
+    frames = [df] if isinstance(df, pd.DataFrame) else df
+    sheet = None
+    row = 1
+    for frame in frames:
+        if sheet is None:
+            sheet = workbook.add_worksheet(name)
+            sheet.write_row(0, 0, list(frame.columns))
+        values = frame.astype(object).where(frame.notna(), None)
+        for record in values.itertuples(index=False):
+            sheet.write_row(row, 0, record)
+            row += 1
+
+@st.cache_data(ttl=600, max_entries=16)
+def build_report(project_id, project_name, client, week_str, revision):
+    """Excel report bytes - revision changes whenever the report tables do"""
+    # Generate comprehensive Excel
+    output = io.BytesIO()
+    
+    # constant_memory flushes each row to a temp file instead of holding the workbook
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    
+    # Summary
+    summary_data = {
+        'Metric': ['Project', 'Client', 'Report Date'],
+        'Value': [project_name, client, week_str]
+    }
+    write_sheet(workbook, 'Summary', pd.DataFrame(summary_data))
+    
+    # Deliverables
+    delivs = DeliverableDB.get_deliverables(project_id)
+    if not delivs.empty:
+        write_sheet(workbook, 'Deliverables', delivs)
+    
+    # Timesheets - the largest table, streamed in chunks
+    timesheets = TimesheetDB.get_timesheets(project_id, chunksize=REPORT_CHUNK_ROWS)
+    write_sheet(workbook, 'Timesheets', (chunk for chunk in timesheets if not chunk.empty))
+    
+    # Change Orders
+    cos = ChangeOrderDB.get_change_orders(project_id)
+    if not cos.empty:
+        write_sheet(workbook, 'Change Orders', cos)
+    
+    # POs
+    pos = PODB.get_purchase_orders(project_id)
+    if not pos.empty:
+        write_sheet(workbook, 'Purchase Orders', pos)
+    
+    workbook.close()
+    return output.getvalue()
+
+@st.fragment
 def page_reports():
     """Report generation"""
     st.title("📊 Reports")
@@ -668,7 +871,7 @@ def page_reports():
         st.warning("Select a project first")
         return
     
-    project = ProjectDB.get_project(st.session_state.current_project_id)
+    project = load_project(st.session_state.current_project_id)
     st.markdown(f"### {project['name']}")
     
     # Weekly commentary
@@ -677,8 +880,7 @@ def page_reports():
     week_ending = st.date_input("Week Ending", datetime.now())
     week_str = week_ending.strftime('%Y-%m-%d')
     
-    commentary = CommentaryDB.get_commentary(
-        st.session_state.current_project_id, week_str)
+    commentary = load_commentary(st.session_state.current_project_id, week_str)
     
     col1, col2 = st.columns(2)
     
@@ -709,6 +911,7 @@ def page_reports():
             issues_risks=issues_risks,
             general_notes=general_notes
         )
+        load_commentary.clear()
         st.success("✅ Commentary saved!")
     
     st.divider()
@@ -717,40 +920,13 @@ def page_reports():
     st.subheader("Export Report")
     
     if st.button("📥 Generate Excel Report", type="primary"):
-        # Generate comprehensive Excel
-        output = io.BytesIO()
-        
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Summary
-            summary_data = {
-                'Metric': ['Project', 'Client', 'Report Date'],
-                'Value': [project['name'], project['client'], week_str]
-            }
-            pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-            
-            # Deliverables
-            delivs = DeliverableDB.get_deliverables(st.session_state.current_project_id)
-            if not delivs.empty:
-                delivs.to_excel(writer, sheet_name='Deliverables', index=False)
-            
-            # Timesheets
-            timesheets = TimesheetDB.get_timesheets(st.session_state.current_project_id)
-            if not timesheets.empty:
-                timesheets.to_excel(writer, sheet_name='Timesheets', index=False)
-            
-            # Change Orders
-            cos = ChangeOrderDB.get_change_orders(st.session_state.current_project_id)
-            if not cos.empty:
-                cos.to_excel(writer, sheet_name='Change Orders', index=False)
-            
-            # POs
-            pos = PODB.get_purchase_orders(st.session_state.current_project_id)
-            if not pos.empty:
-                pos.to_excel(writer, sheet_name='Purchase Orders', index=False)
+        revision = ProjectDB.get_data_revision(st.session_state.current_project_id)
+        report = build_report(st.session_state.current_project_id, project['name'],
+                              project['client'], week_str, revision)
         
         st.download_button(
             "📥 Download Report",
-            output.getvalue(),
+            report,
             f"Report_{project['name']}_{week_str}.xlsx",
             "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -759,6 +935,7 @@ def page_reports():
 # PAGE: FORECAST RECONCILIATION
 # ============================================================================
 
+@st.fragment
 def page_forecast_recon():
     """Reconcile deliverable FTC vs manning forecast"""
     st.title("🔄 Forecast Reconciliation")
@@ -767,7 +944,7 @@ def page_forecast_recon():
         st.warning("Select a project first")
         return
     
-    recon = ManningDB.get_forecast_reconciliation(st.session_state.current_project_id)
+    recon = load_forecast_reconciliation(st.session_state.current_project_id)
     
     col1, col2, col3 = st.columns(3)
     
@@ -790,6 +967,18 @@ def page_forecast_recon():
 # MAIN APP
 # ============================================================================
 
+PAGES = {
+    "🏠 Dashboard": page_dashboard,
+    "📁 Projects": page_projects,
+    "📋 Deliverables": page_deliverables,
+    "📝 Change Orders": page_change_orders,
+    "📦 Purchase Orders": page_purchase_orders,
+    "📤 Import Data": page_import,
+    "📅 Manning Forecast": page_manning,
+    "🔄 Forecast Recon": page_forecast_recon,
+    "📊 Reports": page_reports
+}
+
 def main():
     """Main application"""
     
@@ -803,39 +992,12 @@ def main():
     st.sidebar.markdown("---")
     
     # Navigation
-    page = st.sidebar.radio("Navigation", [
-        "🏠 Dashboard",
-        "📁 Projects",
-        "📋 Deliverables",
-        "📝 Change Orders",
-        "📦 Purchase Orders",
-        "📤 Import Data",
-        "📅 Manning Forecast",
-        "🔄 Forecast Recon",
-        "📊 Reports"
-    ], label_visibility="collapsed")
+    page = st.sidebar.radio("Navigation", list(PAGES), label_visibility="collapsed")
     
     st.sidebar.markdown("---")
     
-    # Route pages
-    if page == "🏠 Dashboard":
-        page_dashboard()
-    elif page == "📁 Projects":
-        page_projects()
-    elif page == "📋 Deliverables":
-        page_deliverables()
-    elif page == "📝 Change Orders":
-        page_change_orders()
-    elif page == "📦 Purchase Orders":
-        page_purchase_orders()
-    elif page == "📤 Import Data":
-        page_import()
-    elif page == "📅 Manning Forecast":
-        page_manning()
-    elif page == "🔄 Forecast Recon":
-        page_forecast_recon()
-    elif page == "📊 Reports":
-        page_reports()
+    # Route pages - each page is a fragment, so its own widgets rerun only the page
+    PAGES[page]()
 
 if __name__ == "__main__":
     main()
@@ -5,510 +5,902 @@ Replace your database.py with this file
 """
 
 import sqlite3
+import io
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import date, datetime, timedelta
 import json
-from typing import Optional, List, Dict
+import functools
+import itertools
+import threading
+import queue
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Union, Iterator
 
 DB_NAME = 'scorecard_v2.db'
 
+# Applied to every connection - WAL lets readers run alongside the writer and
+# NORMAL sync only fsyncs at checkpoints instead of on every commit
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA analysis_limit=1000',
+    'PRAGMA foreign_keys=ON',
+)
+
+# Bump whenever SCHEMA_SQL or the seed data changes so existing databases re-run init
+SCHEMA_VERSION = 7
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_code TEXT UNIQUE NOT NULL, name TEXT NOT NULL,
+    client TEXT NOT NULL, project_type TEXT, start_date TEXT, end_date TEXT, report_date TEXT,
+    contract_value REAL DEFAULT 0, contingency_pct REAL DEFAULT 10, status TEXT DEFAULT 'active',
+    created_date TEXT, created_by TEXT, notes TEXT);
+
+CREATE TABLE IF NOT EXISTS deliverables (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, wbs_code TEXT,
+    deliverable_name TEXT NOT NULL, discipline TEXT NOT NULL, function TEXT NOT NULL,
+    budget_hours REAL NOT NULL DEFAULT 0, status TEXT DEFAULT 'not_started',
+    physical_progress REAL DEFAULT 0, manual_progress_override INTEGER DEFAULT 0,
+    earned_hours REAL DEFAULT 0, forecast_to_complete REAL DEFAULT 0,
+    planned_start TEXT, planned_complete TEXT, actual_start TEXT, actual_complete TEXT,
+    parent_deliverable_id INTEGER, created_date TEXT, modified_date TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE);
+
+CREATE TABLE IF NOT EXISTS change_orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, co_number TEXT NOT NULL,
+    description TEXT NOT NULL, change_type TEXT NOT NULL, client_billable INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'draft', hours_mgmt REAL DEFAULT 0, hours_eng REAL DEFAULT 0,
+    hours_draft REAL DEFAULT 0, total_hours REAL DEFAULT 0, estimated_cost REAL DEFAULT 0,
+    approved_cost REAL DEFAULT 0, fee_recovery REAL DEFAULT 0, created_date TEXT,
+    submitted_date TEXT, approval_date TEXT, incorporated_date TEXT, linked_deliverables TEXT,
+    approved_by TEXT, approval_notes TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE);
+
+CREATE TABLE IF NOT EXISTS purchase_orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, po_number TEXT NOT NULL,
+    supplier TEXT NOT NULL, description TEXT NOT NULL, category TEXT,
+    commitment_value REAL NOT NULL DEFAULT 0, invoiced_to_date REAL DEFAULT 0,
+    accrued_work_done REAL DEFAULT 0, remaining_commitment REAL DEFAULT 0,
+    status TEXT DEFAULT 'issued', issue_date TEXT, expected_completion_date TEXT,
+    close_date TEXT, linked_deliverables TEXT, notes TEXT, created_date TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE);
+
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, po_id INTEGER NOT NULL, invoice_number TEXT NOT NULL,
+    invoice_date TEXT NOT NULL, amount REAL NOT NULL, payment_status TEXT DEFAULT 'received',
+    due_date TEXT, paid_date TEXT, payment_reference TEXT, notes TEXT, created_date TEXT,
+    FOREIGN KEY (po_id) REFERENCES purchase_orders(id) ON DELETE CASCADE);
+
+CREATE TABLE IF NOT EXISTS timesheets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, date TEXT NOT NULL,
+    staff_name TEXT NOT NULL, task_name TEXT, hours REAL NOT NULL, function TEXT NOT NULL,
+    discipline TEXT, position TEXT, rate REAL NOT NULL, cost REAL NOT NULL,
+    week_ending TEXT NOT NULL, deliverable_id INTEGER, import_batch_id TEXT, import_date TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE);
+
+CREATE TABLE IF NOT EXISTS timesheet_weekly_summary (
+    project_id INTEGER NOT NULL, week_ending TEXT NOT NULL, function TEXT NOT NULL, discipline TEXT NOT NULL,
+    hours REAL NOT NULL DEFAULT 0, cost REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, week_ending, function, discipline),
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS manning_forecast (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, person_name TEXT NOT NULL,
+    position TEXT NOT NULL, discipline TEXT NOT NULL, function TEXT NOT NULL,
+    week_ending TEXT NOT NULL, forecast_hours REAL NOT NULL, hourly_rate REAL NOT NULL,
+    forecast_cost REAL NOT NULL, created_date TEXT, modified_date TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    UNIQUE(project_id, person_name, week_ending));
+
+CREATE TABLE IF NOT EXISTS staff (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, function TEXT NOT NULL,
+    discipline TEXT NOT NULL, position TEXT NOT NULL, active INTEGER DEFAULT 1,
+    start_date TEXT, end_date TEXT);
+
+CREATE TABLE IF NOT EXISTS rate_schedule (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, position TEXT NOT NULL, rate REAL NOT NULL,
+    effective_date TEXT NOT NULL, end_date TEXT, UNIQUE(position, effective_date));
+
+CREATE TABLE IF NOT EXISTS budget_transfers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, transfer_date TEXT NOT NULL,
+    from_function TEXT, from_discipline TEXT, to_function TEXT, to_discipline TEXT,
+    hours REAL NOT NULL, reason TEXT NOT NULL, from_deliverable_id INTEGER,
+    to_deliverable_id INTEGER, approved_by TEXT, created_date TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE);
+
+CREATE TABLE IF NOT EXISTS contingency_drawdowns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, drawdown_date TEXT NOT NULL,
+    hours REAL NOT NULL, reason TEXT NOT NULL, allocated_to_deliverable_id INTEGER,
+    approved_by TEXT, created_date TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE);
+
+CREATE TABLE IF NOT EXISTS weekly_snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, snapshot_date TEXT NOT NULL,
+    week_ending TEXT NOT NULL, project_state TEXT NOT NULL, deliverable_state BLOB NOT NULL,
+    forecast_state TEXT NOT NULL, budget_hours REAL, actual_hours REAL, earned_hours REAL,
+    forecast_to_complete REAL, forecast_at_completion REAL, created_by TEXT, notes TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    UNIQUE(project_id, snapshot_date));
+
+CREATE TABLE IF NOT EXISTS weekly_commentary (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, week_ending TEXT NOT NULL,
+    key_activities TEXT, next_period_activities TEXT, issues_risks TEXT, general_notes TEXT,
+    schedule_variance_notes TEXT, cost_variance_notes TEXT, forecast_change_notes TEXT,
+    created_date TEXT, created_by TEXT,
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
+    UNIQUE(project_id, week_ending));
+
+CREATE TABLE IF NOT EXISTS disciplines (
+    code TEXT PRIMARY KEY, name TEXT NOT NULL, function TEXT NOT NULL, active INTEGER DEFAULT 1);
+
+-- Lead with the filter column (status, project_id or po_id); the second matches the ORDER BY / range
+CREATE INDEX IF NOT EXISTS idx_projects_status_date ON projects(status, created_date DESC);
+CREATE INDEX IF NOT EXISTS idx_deliverables_project ON deliverables(project_id, wbs_code);
+CREATE INDEX IF NOT EXISTS idx_deliverables_project_function ON deliverables(project_id, function);
+CREATE INDEX IF NOT EXISTS idx_timesheets_project_date ON timesheets(project_id, date);
+-- Weekly summary groups in index order; replaces the plain (project_id, week_ending) index
+DROP INDEX IF EXISTS idx_timesheets_project_week;
+CREATE INDEX IF NOT EXISTS idx_timesheets_project_week_group ON timesheets(project_id, week_ending, function, discipline);
+CREATE INDEX IF NOT EXISTS idx_timesheets_project_function ON timesheets(project_id, function);
+CREATE INDEX IF NOT EXISTS idx_change_orders_project ON change_orders(project_id, created_date);
+CREATE INDEX IF NOT EXISTS idx_pos_project ON purchase_orders(project_id);
+CREATE INDEX IF NOT EXISTS idx_invoices_po ON invoices(po_id);
+CREATE INDEX IF NOT EXISTS idx_manning_project_week ON manning_forecast(project_id, week_ending);
+-- UNIQUE(project_id, snapshot_date) already indexes snapshots
+DROP INDEX IF EXISTS idx_snapshots_project_date;
+
+-- Invoices apply their own delta to the PO's invoiced_to_date, and any change to a PO's
+-- commitment, invoiced or accrued amounts recomputes its remaining_commitment. Older
+-- trigger versions are replaced, then the totals are re-based once.
+DROP TRIGGER IF EXISTS trg_invoices_insert;
+DROP TRIGGER IF EXISTS trg_invoices_update;
+DROP TRIGGER IF EXISTS trg_invoices_delete;
+DROP TRIGGER IF EXISTS trg_pos_remaining_insert;
+DROP TRIGGER IF EXISTS trg_pos_remaining_update;
+DROP TRIGGER IF EXISTS trg_timesheets_summary_update;
+DROP TRIGGER IF EXISTS trg_timesheets_summary_delete;
+
+CREATE TRIGGER IF NOT EXISTS trg_invoices_insert AFTER INSERT ON invoices BEGIN
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) + NEW.amount WHERE id = NEW.po_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_invoices_update AFTER UPDATE OF po_id, amount ON invoices BEGIN
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) - OLD.amount WHERE id = OLD.po_id;
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) + NEW.amount WHERE id = NEW.po_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_invoices_delete AFTER DELETE ON invoices BEGIN
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) - OLD.amount WHERE id = OLD.po_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pos_remaining_insert AFTER INSERT ON purchase_orders BEGIN
+    UPDATE purchase_orders
+    SET remaining_commitment = commitment_value - COALESCE(invoiced_to_date, 0) - COALESCE(accrued_work_done, 0)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pos_remaining_update
+AFTER UPDATE OF commitment_value, invoiced_to_date, accrued_work_done ON purchase_orders BEGIN
+    UPDATE purchase_orders
+    SET remaining_commitment = commitment_value - COALESCE(invoiced_to_date, 0) - COALESCE(accrued_work_done, 0)
+    WHERE id = NEW.id;
+END;
+
+-- Timesheet rows are only inserted by import_timesheets, which rolls each chunk into timesheet_weekly_summary.
+-- Edits and deletes (including project deletes) are kept current here; a key with no timesheets left is removed.
+CREATE TRIGGER IF NOT EXISTS trg_timesheets_summary_update
+AFTER UPDATE OF project_id, week_ending, function, discipline, hours, cost ON timesheets BEGIN
+    UPDATE timesheet_weekly_summary SET hours = hours - OLD.hours, cost = cost - OLD.cost
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '');
+    DELETE FROM timesheet_weekly_summary
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '')
+    AND NOT EXISTS (SELECT 1 FROM timesheets WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+                    AND function = OLD.function AND COALESCE(discipline, '') = COALESCE(OLD.discipline, ''));
+    INSERT INTO timesheet_weekly_summary (project_id, week_ending, function, discipline, hours, cost)
+    VALUES (NEW.project_id, NEW.week_ending, NEW.function, COALESCE(NEW.discipline, ''), NEW.hours, NEW.cost)
+    ON CONFLICT (project_id, week_ending, function, discipline)
+    DO UPDATE SET hours = hours + excluded.hours, cost = cost + excluded.cost;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_timesheets_summary_delete AFTER DELETE ON timesheets BEGIN
+    UPDATE timesheet_weekly_summary SET hours = hours - OLD.hours, cost = cost - OLD.cost
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '');
+    DELETE FROM timesheet_weekly_summary
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '')
+    AND NOT EXISTS (SELECT 1 FROM timesheets WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+                    AND function = OLD.function AND COALESCE(discipline, '') = COALESCE(OLD.discipline, ''));
+END;
+
+UPDATE purchase_orders SET invoiced_to_date = (SELECT COALESCE(SUM(amount), 0) FROM invoices WHERE po_id = purchase_orders.id);
+
+-- Rebuild the weekly rollup from timesheets in case it predates the triggers
+DELETE FROM timesheet_weekly_summary;
+INSERT INTO timesheet_weekly_summary (project_id, week_ending, function, discipline, hours, cost)
+SELECT project_id, week_ending, function, COALESCE(discipline, ''), SUM(hours), SUM(cost)
+FROM timesheets GROUP BY project_id, week_ending, function, COALESCE(discipline, '');
+"""
+
+def _apply_schema(c: sqlite3.Cursor):
+    """Create or upgrade the schema and seed master data"""
+    # One parse and one transaction for the whole schema
+    c.executescript('BEGIN;\n' + SCHEMA_SQL + 'COMMIT;')
+    
+    def seed(table, sql, rows):
+        # Only seed empty tables - skips the inserts on every later start
+        if c.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0:
+            c.executemany(sql, rows)
+
+    disciplines = [('GN', 'General/Management', 'MANAGEMENT'), ('ME', 'Mechanical', 'ENGINEERING'),
+                  ('EE', 'Electrical', 'ENGINEERING'), ('IC', 'Instrumentation & Control', 'ENGINEERING'),
+                  ('ST', 'Structural', 'ENGINEERING'), ('CIVIL', 'Civil', 'ENGINEERING'),
+                  ('PROC', 'Process', 'ENGINEERING'), ('CAD', 'CAD/Drafting', 'DRAFTING')]
+    seed('disciplines', 'INSERT OR IGNORE INTO disciplines (code, name, function) VALUES (?, ?, ?)', disciplines)
+
+    default_staff = [('Gavin Andersen', 'MANAGEMENT', 'GN', 'Engineering Manager'),
+                    ('Mark Rankin', 'DRAFTING', 'GN', 'Drawing Office Manager'),
+                    ('Ben Robinson', 'ENGINEERING', 'ME', 'Senior Engineer'),
+                    ('Will Smith', 'ENGINEERING', 'ME', 'Lead Engineer'),
+                    ('Ben Bowles', 'ENGINEERING', 'ME', 'Senior Engineer')]
+    seed('staff', 'INSERT OR IGNORE INTO staff (name, function, discipline, position) VALUES (?, ?, ?, ?)', default_staff)
+
+    default_rates = [('Engineering Manager', 245.0, '2025-01-01'), ('Lead Engineer', 195.0, '2025-01-01'),
+                    ('Senior Engineer', 170.0, '2025-01-01'), ('Drawing Office Manager', 195.0, '2025-01-01'),
+                    ('Lead Designer', 165.0, '2025-01-01'), ('Senior Designer', 150.0, '2025-01-01'),
+                    ('Designer', 140.0, '2025-01-01')]
+    seed('rate_schedule', 'INSERT OR IGNORE INTO rate_schedule (position, rate, effective_date) VALUES (?, ?, ?)', default_rates)
+
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
 def init_database():
     """Initialize database - embedded schema"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
+    global _schema_ready
+    with _schema_lock:
+        # A dedicated connection - get_connection waits on this lock until the schema exists
+        conn = _open_connection()
+        try:
+            c = conn.cursor()
+            if c.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                _apply_schema(c)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        _schema_ready = True
+    MasterDataDB.invalidate_caches()
+    _table_columns.cache_clear()
+
+_POOL = queue.Queue(maxsize=8)
+_schema_ready = False
+_schema_lock = threading.RLock()
+_write_generation = 0
+_generation_lock = threading.Lock()
+
+def _open_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, cached_statements=256)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def _ensure_schema():
+    """Run init_database once, on first use rather than at import"""
+    # Checked again under the lock - late threads wait for the first init to finish
+    with _schema_lock:
+        if not _schema_ready:
+            init_database()
+
+@contextmanager
+def get_connection():
+    """Pooled connection, held by one caller at a time"""
+    global _write_generation
+    if not _schema_ready:
+        _ensure_schema()
+    try:
+        conn = _POOL.get_nowait()
+    except queue.Empty:
+        conn = _open_connection()
+    changes = conn.total_changes
     try:
-        c.execute('''CREATE TABLE IF NOT EXISTS projects (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_code TEXT UNIQUE NOT NULL, name TEXT NOT NULL,
-            client TEXT NOT NULL, project_type TEXT, start_date TEXT, end_date TEXT, report_date TEXT,
-            contract_value REAL DEFAULT 0, contingency_pct REAL DEFAULT 10, status TEXT DEFAULT 'active',
-            created_date TEXT, created_by TEXT, notes TEXT)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS deliverables (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, wbs_code TEXT,
-            deliverable_name TEXT NOT NULL, discipline TEXT NOT NULL, function TEXT NOT NULL,
-            budget_hours REAL NOT NULL DEFAULT 0, status TEXT DEFAULT 'not_started',
-            physical_progress REAL DEFAULT 0, manual_progress_override INTEGER DEFAULT 0,
-            earned_hours REAL DEFAULT 0, forecast_to_complete REAL DEFAULT 0,
-            planned_start TEXT, planned_complete TEXT, actual_start TEXT, actual_complete TEXT,
-            parent_deliverable_id INTEGER, created_date TEXT, modified_date TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS change_orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, co_number TEXT NOT NULL,
-            description TEXT NOT NULL, change_type TEXT NOT NULL, client_billable INTEGER DEFAULT 0,
-            status TEXT DEFAULT 'draft', hours_mgmt REAL DEFAULT 0, hours_eng REAL DEFAULT 0,
-            hours_draft REAL DEFAULT 0, total_hours REAL DEFAULT 0, estimated_cost REAL DEFAULT 0,
-            approved_cost REAL DEFAULT 0, fee_recovery REAL DEFAULT 0, created_date TEXT,
-            submitted_date TEXT, approval_date TEXT, incorporated_date TEXT, linked_deliverables TEXT,
-            approved_by TEXT, approval_notes TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS purchase_orders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, po_number TEXT NOT NULL,
-            supplier TEXT NOT NULL, description TEXT NOT NULL, category TEXT,
-            commitment_value REAL NOT NULL DEFAULT 0, invoiced_to_date REAL DEFAULT 0,
-            accrued_work_done REAL DEFAULT 0, remaining_commitment REAL DEFAULT 0,
-            status TEXT DEFAULT 'issued', issue_date TEXT, expected_completion_date TEXT,
-            close_date TEXT, linked_deliverables TEXT, notes TEXT, created_date TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS invoices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, po_id INTEGER NOT NULL, invoice_number TEXT NOT NULL,
-            invoice_date TEXT NOT NULL, amount REAL NOT NULL, payment_status TEXT DEFAULT 'received',
-            due_date TEXT, paid_date TEXT, payment_reference TEXT, notes TEXT, created_date TEXT,
-            FOREIGN KEY (po_id) REFERENCES purchase_orders(id) ON DELETE CASCADE)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS timesheets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, date TEXT NOT NULL,
-            staff_name TEXT NOT NULL, task_name TEXT, hours REAL NOT NULL, function TEXT NOT NULL,
-            discipline TEXT, position TEXT, rate REAL NOT NULL, cost REAL NOT NULL,
-            week_ending TEXT NOT NULL, deliverable_id INTEGER, import_batch_id TEXT, import_date TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS manning_forecast (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, person_name TEXT NOT NULL,
-            position TEXT NOT NULL, discipline TEXT NOT NULL, function TEXT NOT NULL,
-            week_ending TEXT NOT NULL, forecast_hours REAL NOT NULL, hourly_rate REAL NOT NULL,
-            forecast_cost REAL NOT NULL, created_date TEXT, modified_date TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
-            UNIQUE(project_id, person_name, week_ending))''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS staff (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL, function TEXT NOT NULL,
-            discipline TEXT NOT NULL, position TEXT NOT NULL, active INTEGER DEFAULT 1,
-            start_date TEXT, end_date TEXT)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS rate_schedule (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, position TEXT NOT NULL, rate REAL NOT NULL,
-            effective_date TEXT NOT NULL, end_date TEXT, UNIQUE(position, effective_date))''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS budget_transfers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, transfer_date TEXT NOT NULL,
-            from_function TEXT, from_discipline TEXT, to_function TEXT, to_discipline TEXT,
-            hours REAL NOT NULL, reason TEXT NOT NULL, from_deliverable_id INTEGER,
-            to_deliverable_id INTEGER, approved_by TEXT, created_date TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS contingency_drawdowns (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, drawdown_date TEXT NOT NULL,
-            hours REAL NOT NULL, reason TEXT NOT NULL, allocated_to_deliverable_id INTEGER,
-            approved_by TEXT, created_date TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE)''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS weekly_snapshots (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, snapshot_date TEXT NOT NULL,
-            week_ending TEXT NOT NULL, project_state TEXT NOT NULL, deliverable_state TEXT NOT NULL,
-            forecast_state TEXT NOT NULL, budget_hours REAL, actual_hours REAL, earned_hours REAL,
-            forecast_to_complete REAL, forecast_at_completion REAL, created_by TEXT, notes TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
-            UNIQUE(project_id, snapshot_date))''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS weekly_commentary (
-            id INTEGER PRIMARY KEY AUTOINCREMENT, project_id INTEGER NOT NULL, week_ending TEXT NOT NULL,
-            key_activities TEXT, next_period_activities TEXT, issues_risks TEXT, general_notes TEXT,
-            schedule_variance_notes TEXT, cost_variance_notes TEXT, forecast_change_notes TEXT,
-            created_date TEXT, created_by TEXT,
-            FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
-            UNIQUE(project_id, week_ending))''')
-        
-        c.execute('''CREATE TABLE IF NOT EXISTS disciplines (
-            code TEXT PRIMARY KEY, name TEXT NOT NULL, function TEXT NOT NULL, active INTEGER DEFAULT 1)''')
-        
-        disciplines = [('GN', 'General/Management', 'MANAGEMENT'), ('ME', 'Mechanical', 'ENGINEERING'),
-                      ('EE', 'Electrical', 'ENGINEERING'), ('IC', 'Instrumentation & Control', 'ENGINEERING'),
-                      ('ST', 'Structural', 'ENGINEERING'), ('CIVIL', 'Civil', 'ENGINEERING'),
-                      ('PROC', 'Process', 'ENGINEERING'), ('CAD', 'CAD/Drafting', 'DRAFTING')]
-        c.executemany('INSERT OR IGNORE INTO disciplines (code, name, function) VALUES (?, ?, ?)', disciplines)
-        
-        default_staff = [('Gavin Andersen', 'MANAGEMENT', 'GN', 'Engineering Manager'),
-                        ('Mark Rankin', 'DRAFTING', 'GN', 'Drawing Office Manager'),
-                        ('Ben Robinson', 'ENGINEERING', 'ME', 'Senior Engineer'),
-                        ('Will Smith', 'ENGINEERING', 'ME', 'Lead Engineer'),
-                        ('Ben Bowles', 'ENGINEERING', 'ME', 'Senior Engineer')]
-        c.executemany('INSERT OR IGNORE INTO staff (name, function, discipline, position) VALUES (?, ?, ?, ?)', default_staff)
-        
-        default_rates = [('Engineering Manager', 245.0, '2025-01-01'), ('Lead Engineer', 195.0, '2025-01-01'),
-                        ('Senior Engineer', 170.0, '2025-01-01'), ('Drawing Office Manager', 195.0, '2025-01-01'),
-                        ('Lead Designer', 165.0, '2025-01-01'), ('Senior Designer', 150.0, '2025-01-01'),
-                        ('Designer', 140.0, '2025-01-01')]
-        c.executemany('INSERT OR IGNORE INTO rate_schedule (position, rate, effective_date) VALUES (?, ?, ?)', default_rates)
-        
+        yield conn
+    finally:
+        # Never hand a half-written transaction to the next caller
+        if conn.in_transaction:
+            conn.rollback()
+        if conn.total_changes != changes:
+            with _generation_lock:
+                _write_generation += 1
+        try:
+            _POOL.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+@contextmanager
+def db_transaction():
+    """One write transaction for several calls - pass the connection as their conn argument"""
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
         conn.commit()
-    except Exception as e:
-        print(f"DB init error: {e}")
-    conn.close()
 
-def get_connection():
-    return sqlite3.connect(DB_NAME)
+@contextmanager
+def _write_connection(conn=None):
+    """The caller's transaction connection, or a pooled one committed on exit"""
+    if conn is not None:
+        yield conn
+        return
+    with get_connection() as conn:
+        yield conn
+        conn.commit()
+
+# INSERT ... RETURNING needs SQLite 3.35+
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def _insert(cursor, sql: str, params) -> int:
+    """Run a single-row INSERT and return the new row id"""
+    if HAS_RETURNING:
+        return cursor.execute(sql + ' RETURNING id', params).fetchall()[0][0]
+    cursor.execute(sql, params)
+    return cursor.lastrowid
+
+@functools.lru_cache(maxsize=None)
+def _table_columns(table: str) -> frozenset:
+    with get_connection() as conn:
+        columns = frozenset(row[1] for row in conn.execute(f"PRAGMA table_info({table})"))
+    if not columns:
+        # Raising keeps lru_cache from pinning an empty set for a table that doesn't exist yet
+        raise ValueError(f"Unknown table: {table}")
+    return columns
+
+def _select_list(table: str, columns: Optional[List[str]] = None) -> str:
+    """SELECT list for a table - validated column names, or * when none given"""
+    if not columns:
+        return '*'
+    unknown = set(columns) - _table_columns(table)
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {', '.join(sorted(unknown))}")
+    return ', '.join(columns)
+
+def _ensure_date(value) -> str:
+    """YYYY-MM-DD for a date, datetime or ISO string - bad input fails before any SQL runs"""
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    try:
+        return datetime.fromisoformat(str(value)).strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r}") from None
+
+def _read_sql(sql: str, params, chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """DataFrame, or an iterator of chunksize-row DataFrames when chunksize is given"""
+    if chunksize:
+        return _read_sql_chunks(sql, params, chunksize)
+    with get_connection() as conn:
+        return pd.read_sql(sql, conn, params=params)
+
+def _read_sql_chunks(sql: str, params, chunksize: int) -> Iterator[pd.DataFrame]:
+    # Holds its pooled connection until the chunks are exhausted or the iterator is dropped
+    with get_connection() as conn:
+        yield from pd.read_sql(sql, conn, params=params, chunksize=chunksize)
+
+@functools.lru_cache(maxsize=64)
+def _update_sql(table: str, keys: tuple) -> str:
+    """UPDATE by id for a sorted tuple of validated columns - one string per shape keeps statement cache hits"""
+    return f"UPDATE {table} SET {', '.join(f'{k}=?' for k in keys)} WHERE id=?"
+
+# Row identity and ownership are fixed once inserted
+IMMUTABLE_COLUMNS = frozenset({'id', 'project_id', 'created_date'})
+
+def _update_by_id(conn, table: str, row_id: int, values: Dict):
+    if not values:
+        return
+    keys = tuple(sorted(values))
+    _select_list(table, list(keys))  # column names can't be bound - reject unknown ones
+    fixed = IMMUTABLE_COLUMNS.intersection(keys)
+    if fixed:
+        raise ValueError(f"Cannot update {table} columns: {', '.join(sorted(fixed))}")
+    conn.execute(_update_sql(table, keys), [values[k] for k in keys] + [row_id])
 
 class ProjectDB:
     @staticmethod
-    def create_project(name: str, client: str, project_code: str, **kwargs) -> int:
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute('''INSERT INTO projects (project_code, name, client, project_type, start_date, end_date, 
-                     contract_value, contingency_pct, status, created_date, report_date)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (project_code, name, client, kwargs.get('project_type', 'EPCM'),
-                   kwargs.get('start_date'), kwargs.get('end_date'), kwargs.get('contract_value', 0),
-                   kwargs.get('contingency_pct', 10), 'active', datetime.now().isoformat(),
-                   kwargs.get('report_date', datetime.now().strftime('%Y-%m-%d'))))
-        project_id = c.lastrowid
-        conn.commit()
-        conn.close()
+    def create_project(name: str, client: str, project_code: str, conn=None, **kwargs) -> int:
+        now = datetime.now()
+        with _write_connection(conn) as conn:
+            c = conn.cursor()
+            project_id = _insert(c, '''INSERT INTO projects (project_code, name, client, project_type, start_date, end_date, 
+                         contract_value, contingency_pct, status, created_date, report_date)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (project_code, name, client, kwargs.get('project_type', 'EPCM'),
+                       kwargs.get('start_date'), kwargs.get('end_date'), kwargs.get('contract_value', 0),
+                       kwargs.get('contingency_pct', 10), 'active', now.isoformat(),
+                       kwargs.get('report_date', now.strftime('%Y-%m-%d'))))
         return project_id
     
     @staticmethod
     def get_project(project_id: int) -> Optional[Dict]:
-        conn = get_connection()
-        df = pd.read_sql(f"SELECT * FROM projects WHERE id={project_id}", conn)
-        conn.close()
-        return df.iloc[0].to_dict() if not df.empty else None
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.row_factory = sqlite3.Row  # per cursor - pd.read_sql shares this connection and needs tuples
+            row = c.execute("SELECT * FROM projects WHERE id=?", (project_id,)).fetchone()
+        return dict(row) if row else None
     
     @staticmethod
-    def get_all_projects(status: str = 'active') -> pd.DataFrame:
-        conn = get_connection()
-        try:
-            df = pd.read_sql("SELECT * FROM projects ORDER BY created_date DESC", conn)
-            if not df.empty and 'status' in df.columns:
-                df = df[df['status'] == status]
-        except:
-            df = pd.DataFrame()
-        conn.close()
+    def get_all_projects(status: str = 'active', columns: Optional[List[str]] = None) -> pd.DataFrame:
+        select = _select_list('projects', columns)
+        with get_connection() as conn:
+            df = pd.read_sql(f"SELECT {select} FROM projects WHERE status=? ORDER BY created_date DESC",
+                             conn, params=(status,))
         return df
     
     @staticmethod
-    def update_project(project_id: int, **kwargs):
-        conn = get_connection()
-        c = conn.cursor()
-        fields = ', '.join([f"{k}=?" for k in kwargs.keys()])
-        values = list(kwargs.values()) + [project_id]
-        c.execute(f"UPDATE projects SET {fields} WHERE id=?", values)
-        conn.commit()
-        conn.close()
+    def update_project(project_id: int, conn=None, **kwargs):
+        with _write_connection(conn) as conn:
+            _update_by_id(conn, 'projects', project_id, kwargs)
+    
+    @staticmethod
+    def get_data_revision(project_id: int) -> tuple:
+        """Cheap change marker for a project's report tables"""
+        with get_connection() as conn:
+            counts = conn.execute('''SELECT
+                (SELECT COUNT(*) FROM deliverables WHERE project_id=:pid), (SELECT MAX(id) FROM deliverables WHERE project_id=:pid),
+                (SELECT COUNT(*) FROM timesheets WHERE project_id=:pid), (SELECT MAX(id) FROM timesheets WHERE project_id=:pid),
+                (SELECT COUNT(*) FROM change_orders WHERE project_id=:pid), (SELECT MAX(id) FROM change_orders WHERE project_id=:pid),
+                (SELECT COUNT(*) FROM purchase_orders WHERE project_id=:pid), (SELECT MAX(id) FROM purchase_orders WHERE project_id=:pid)''',
+                {'pid': project_id}).fetchone()
+        # Row counts and ids miss in-place UPDATEs, so add the pool's write counter
+        return counts + (_write_generation,)
     
     @staticmethod
     def get_project_summary(project_id: int) -> Dict:
-        conn = get_connection()
-        budget = pd.read_sql(f"SELECT function, SUM(budget_hours) as budget_hours FROM deliverables WHERE project_id={project_id} GROUP BY function", conn)
-        actuals = pd.read_sql(f"SELECT function, SUM(hours) as actual_hours, SUM(cost) as actual_cost FROM timesheets WHERE project_id={project_id} GROUP BY function", conn)
-        earned = pd.read_sql(f"SELECT function, SUM(CASE WHEN manual_progress_override=1 THEN earned_hours ELSE budget_hours * physical_progress / 100.0 END) as earned_hours FROM deliverables WHERE project_id={project_id} GROUP BY function", conn)
-        ftc = pd.read_sql(f"SELECT function, SUM(forecast_to_complete) as ftc FROM deliverables WHERE project_id={project_id} GROUP BY function", conn)
-        conn.close()
+        with get_connection() as conn:
+            # One pass over deliverables for budget, earned and FTC
+            by_function = pd.read_sql("""SELECT function, SUM(budget_hours) as budget_hours,
+                                         SUM(CASE WHEN manual_progress_override=1 THEN earned_hours ELSE budget_hours * physical_progress / 100.0 END) as earned_hours,
+                                         SUM(forecast_to_complete) as ftc
+                                         FROM deliverables WHERE project_id=? GROUP BY function""", conn, params=(project_id,))
+            actuals = pd.read_sql("SELECT function, SUM(hours) as actual_hours, SUM(cost) as actual_cost FROM timesheets WHERE project_id=? GROUP BY function", conn, params=(project_id,))
+        budget = by_function[['function', 'budget_hours']]
+        earned = by_function[['function', 'earned_hours']]
+        ftc = by_function[['function', 'ftc']]
         return {'budget': budget, 'actuals': actuals, 'earned': earned, 'forecast': ftc}
 
+# Rows per executemany call - bounds the parameter tuples held in memory at once
+BATCH = 10_000
+
+# Deliverable saves larger than this drop and rebuild the secondary indexes,
+# and loads this large re-ANALYZE their table
+DEFER_INDEX_ROWS = 1000
+
+# Ids fit in int32; hours stay float64 because the editor writes them back
+DELIVERABLE_DTYPES = {
+    'id': 'int32', 'project_id': 'int32', 'budget_hours': 'float64', 'physical_progress': 'float64',
+    'earned_hours': 'float64', 'forecast_to_complete': 'float64'
+}
+
+DELIVERABLE_DEFAULTS = {
+    'wbs_code': '', 'status': 'not_started', 'physical_progress': 0,
+    'manual_progress_override': 0, 'earned_hours': 0
+}
+
 class DeliverableDB:
     @staticmethod
-    def create_deliverable(project_id: int, name: str, discipline: str, function: str, budget_hours: float, **kwargs) -> int:
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute('''INSERT INTO deliverables (project_id, wbs_code, deliverable_name, discipline, function, 
-                     budget_hours, status, physical_progress, forecast_to_complete, created_date)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (project_id, kwargs.get('wbs_code', ''), name, discipline, function, budget_hours,
-                   kwargs.get('status', 'not_started'), 0, budget_hours, datetime.now().isoformat()))
-        deliv_id = c.lastrowid
-        conn.commit()
-        conn.close()
+    def create_deliverable(project_id: int, name: str, discipline: str, function: str, budget_hours: float,
+                           conn=None, **kwargs) -> int:
+        with _write_connection(conn) as conn:
+            c = conn.cursor()
+            deliv_id = _insert(c, '''INSERT INTO deliverables (project_id, wbs_code, deliverable_name, discipline, function, 
+                         budget_hours, status, physical_progress, forecast_to_complete, created_date)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (project_id, kwargs.get('wbs_code', ''), name, discipline, function, budget_hours,
+                       kwargs.get('status', 'not_started'), 0, budget_hours, datetime.now().isoformat()))
         return deliv_id
     
     @staticmethod
-    def update_deliverable(deliv_id: int, **kwargs):
-        conn = get_connection()
-        c = conn.cursor()
-        kwargs['modified_date'] = datetime.now().isoformat()
-        fields = ', '.join([f"{k}=?" for k in kwargs.keys()])
-        values = list(kwargs.values()) + [deliv_id]
-        c.execute(f"UPDATE deliverables SET {fields} WHERE id=?", values)
-        conn.commit()
-        conn.close()
+    def update_deliverable(deliv_id: int, conn=None, **kwargs):
+        with _write_connection(conn) as conn:
+            if 'modified_date' not in kwargs:
+                # Batched callers can pass one shared timestamp instead
+                kwargs['modified_date'] = datetime.now().isoformat()
+            _update_by_id(conn, 'deliverables', deliv_id, kwargs)
     
     @staticmethod
-    def get_deliverables(project_id: int) -> pd.DataFrame:
-        conn = get_connection()
-        df = pd.read_sql(f"SELECT * FROM deliverables WHERE project_id={project_id} ORDER BY wbs_code", conn)
-        conn.close()
+    def get_deliverables(project_id: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        with get_connection() as conn:
+            dtype = {c: t for c, t in DELIVERABLE_DTYPES.items() if not columns or c in columns}
+            df = pd.read_sql(f"SELECT {_select_list('deliverables', columns)} FROM deliverables WHERE project_id=? ORDER BY wbs_code",
+                             conn, params=(project_id,), dtype=dtype)
         return df
     
     @staticmethod
     def calculate_earned_value(project_id: int) -> Dict:
-        conn = get_connection()
-        df = pd.read_sql(f"SELECT CASE WHEN manual_progress_override=1 THEN earned_hours ELSE budget_hours * physical_progress / 100.0 END as earned FROM deliverables WHERE project_id={project_id}", conn)
-        conn.close()
-        return {'earned_hours': df['earned'].sum() if not df.empty else 0}
+        with get_connection() as conn:
+            earned = conn.execute("SELECT COALESCE(SUM(CASE WHEN manual_progress_override=1 THEN earned_hours ELSE budget_hours * physical_progress / 100.0 END), 0) FROM deliverables WHERE project_id=?",
+                                  (project_id,)).fetchone()[0]
+        return {'earned_hours': earned}
     
     @staticmethod
     def bulk_update_deliverables(project_id: int, df: pd.DataFrame):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute(f"DELETE FROM deliverables WHERE project_id={project_id}")
-        for _, row in df.iterrows():
-            c.execute('''INSERT INTO deliverables (project_id, wbs_code, deliverable_name, discipline, function, 
-                         budget_hours, status, physical_progress, manual_progress_override, earned_hours, 
-                         forecast_to_complete, created_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (project_id, row.get('wbs_code', ''), row['deliverable_name'], row['discipline'], 
-                       row['function'], row['budget_hours'], row.get('status', 'not_started'),
-                       row.get('physical_progress', 0), row.get('manual_progress_override', 0),
-                       row.get('earned_hours', 0), row.get('forecast_to_complete', row['budget_hours']),
-                       datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        # Python scalars with None for nulls - sqlite3 cannot bind numpy ints or bools
+        df = df.astype(object).where(df.notna(), None)
+        # Blank cells (e.g. rows added in the editor) get the same defaults as missing columns
+        for col, default in DELIVERABLE_DEFAULTS.items():
+            df[col] = np.where(df[col].notna(), df[col], default) if col in df else default
+        ftc = df['forecast_to_complete'] if 'forecast_to_complete' in df else df['budget_hours']
+        ftc = np.where(ftc.notna(), ftc, df['budget_hours'])
+        # Rows without an id (new in the editor, or no id column at all) are inserted
+        ids = [None if i is None else int(i) for i in df['id']] if 'id' in df else [None] * len(df)
+        inserted = sum(i is None for i in ids)
+        now = datetime.now().isoformat()
+        rows = zip(ids, itertools.repeat(project_id), df['wbs_code'], df['deliverable_name'], df['discipline'],
+                   df['function'], df['budget_hours'], df['status'], df['physical_progress'],
+                   df['manual_progress_override'], df['earned_hours'], ftc,
+                   itertools.repeat(now), itertools.repeat(now))
+        with db_transaction() as conn:
+            changes = conn.total_changes
+            # Drop rows removed in the editor, then upsert by id - unchanged rows are not rewritten
+            conn.execute("DELETE FROM deliverables WHERE project_id=? AND id NOT IN (SELECT value FROM json_each(?))",
+                         (project_id, json.dumps([i for i in ids if i is not None])))
+            # Big loads are cheaper with one index build at the end than per-row index updates
+            deferred = []
+            if inserted > DEFER_INDEX_ROWS:
+                deferred = conn.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND tbl_name='deliverables' AND sql IS NOT NULL").fetchall()
+                for name, _ in deferred:
+                    conn.execute(f"DROP INDEX {name}")
+            for batch in iter(lambda: list(itertools.islice(rows, BATCH)), []):
+                conn.executemany('''INSERT INTO deliverables (id, project_id, wbs_code, deliverable_name, discipline, function,
+                                    budget_hours, status, physical_progress, manual_progress_override, earned_hours,
+                                    forecast_to_complete, created_date, modified_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                    ON CONFLICT(id) DO UPDATE SET wbs_code=excluded.wbs_code, deliverable_name=excluded.deliverable_name,
+                                    discipline=excluded.discipline, function=excluded.function, budget_hours=excluded.budget_hours,
+                                    status=excluded.status, physical_progress=excluded.physical_progress,
+                                    manual_progress_override=excluded.manual_progress_override, earned_hours=excluded.earned_hours,
+                                    forecast_to_complete=excluded.forecast_to_complete, modified_date=excluded.modified_date
+                                    WHERE deliverables.project_id = excluded.project_id
+                                    AND (deliverables.wbs_code, deliverables.deliverable_name, deliverables.discipline,
+                                         deliverables.function, deliverables.budget_hours, deliverables.status,
+                                         deliverables.physical_progress, deliverables.manual_progress_override,
+                                         deliverables.earned_hours, deliverables.forecast_to_complete)
+                                    IS NOT (excluded.wbs_code, excluded.deliverable_name, excluded.discipline,
+                                            excluded.function, excluded.budget_hours, excluded.status,
+                                            excluded.physical_progress, excluded.manual_progress_override,
+                                            excluded.earned_hours, excluded.forecast_to_complete)''', batch)
+            for _, sql in deferred:
+                conn.execute(sql)
+            if conn.total_changes - changes > DEFER_INDEX_ROWS:
+                # Refresh planner statistics only after a large write - rows the upsert skipped don't count
+                conn.execute("ANALYZE deliverables")
 
 class ChangeOrderDB:
     @staticmethod
     def create_change_order(project_id: int, co_number: str, description: str, change_type: str, **kwargs) -> int:
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute('''INSERT INTO change_orders (project_id, co_number, description, change_type, status,
-                     hours_mgmt, hours_eng, hours_draft, client_billable, estimated_cost, created_date)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (project_id, co_number, description, change_type, kwargs.get('status', 'draft'),
-                   kwargs.get('hours_mgmt', 0), kwargs.get('hours_eng', 0), kwargs.get('hours_draft', 0),
-                   kwargs.get('client_billable', 0), kwargs.get('estimated_cost', 0), datetime.now().isoformat()))
-        co_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            co_id = _insert(c, '''INSERT INTO change_orders (project_id, co_number, description, change_type, status,
+                         hours_mgmt, hours_eng, hours_draft, client_billable, estimated_cost, created_date)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (project_id, co_number, description, change_type, kwargs.get('status', 'draft'),
+                       kwargs.get('hours_mgmt', 0), kwargs.get('hours_eng', 0), kwargs.get('hours_draft', 0),
+                       kwargs.get('client_billable', 0), kwargs.get('estimated_cost', 0), datetime.now().isoformat()))
+            conn.commit()
         return co_id
     
     @staticmethod
-    def get_change_orders(project_id: int) -> pd.DataFrame:
-        conn = get_connection()
-        df = pd.read_sql(f"SELECT * FROM change_orders WHERE project_id={project_id} ORDER BY created_date DESC", conn)
-        conn.close()
+    def get_change_orders(project_id: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        with get_connection() as conn:
+            df = pd.read_sql(f"SELECT {_select_list('change_orders', columns)} FROM change_orders WHERE project_id=? ORDER BY created_date DESC",
+                             conn, params=(project_id,))
         return df
     
     @staticmethod
     def update_change_order(co_id: int, **kwargs):
-        conn = get_connection()
-        c = conn.cursor()
-        fields = ', '.join([f"{k}=?" for k in kwargs.keys()])
-        values = list(kwargs.values()) + [co_id]
-        c.execute(f"UPDATE change_orders SET {fields} WHERE id=?", values)
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            _update_by_id(conn, 'change_orders', co_id, kwargs)
+            conn.commit()
 
 class PODB:
     @staticmethod
     def create_po(project_id: int, po_number: str, supplier: str, description: str, commitment_value: float, **kwargs) -> int:
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute('''INSERT INTO purchase_orders (project_id, po_number, supplier, description, category,
-                     commitment_value, status, issue_date, created_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (project_id, po_number, supplier, description, kwargs.get('category', 'services'),
-                   commitment_value, 'issued', kwargs.get('issue_date', datetime.now().strftime('%Y-%m-%d')),
-                   datetime.now().isoformat()))
-        po_id = c.lastrowid
-        conn.commit()
-        conn.close()
+        now = datetime.now()
+        with get_connection() as conn:
+            c = conn.cursor()
+            po_id = _insert(c, '''INSERT INTO purchase_orders (project_id, po_number, supplier, description, category,
+                         commitment_value, status, issue_date, created_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (project_id, po_number, supplier, description, kwargs.get('category', 'services'),
+                       commitment_value, 'issued', kwargs.get('issue_date', now.strftime('%Y-%m-%d')),
+                       now.isoformat()))
+            conn.commit()
         return po_id
     
     @staticmethod
-    def get_purchase_orders(project_id: int) -> pd.DataFrame:
-        conn = get_connection()
-        df = pd.read_sql(f"SELECT * FROM purchase_orders WHERE project_id={project_id}", conn)
-        conn.close()
+    def get_purchase_orders(project_id: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        with get_connection() as conn:
+            df = pd.read_sql(f"SELECT {_select_list('purchase_orders', columns)} FROM purchase_orders WHERE project_id=?",
+                             conn, params=(project_id,))
         return df
     
     @staticmethod
     def update_po_accrual(po_id: int, accrued_work_done: float):
-        conn = get_connection()
-        c = conn.cursor()
-        invoiced = pd.read_sql(f"SELECT SUM(amount) as total FROM invoices WHERE po_id={po_id}", conn).iloc[0]['total']
-        invoiced = invoiced if invoiced else 0
-        commitment = pd.read_sql(f"SELECT commitment_value FROM purchase_orders WHERE id={po_id}", conn).iloc[0]['commitment_value']
-        remaining = commitment - invoiced - accrued_work_done
-        c.execute('UPDATE purchase_orders SET accrued_work_done=?, remaining_commitment=? WHERE id=?',
-                 (accrued_work_done, remaining, po_id))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            # trg_pos_remaining_update recomputes remaining_commitment
+            c.execute("UPDATE purchase_orders SET accrued_work_done=? WHERE id=?", (accrued_work_done, po_id))
+            conn.commit()
 
 class InvoiceDB:
     @staticmethod
     def create_invoice(po_id: int, invoice_number: str, invoice_date: str, amount: float, **kwargs) -> int:
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute('''INSERT INTO invoices (po_id, invoice_number, invoice_date, amount, payment_status, created_date)
-                     VALUES (?, ?, ?, ?, ?, ?)''',
-                  (po_id, invoice_number, invoice_date, amount, kwargs.get('payment_status', 'received'),
-                   datetime.now().isoformat()))
-        invoice_id = c.lastrowid
-        total_invoiced = pd.read_sql(f"SELECT SUM(amount) as total FROM invoices WHERE po_id={po_id}", conn).iloc[0]['total']
-        c.execute("UPDATE purchase_orders SET invoiced_to_date=? WHERE id=?", (total_invoiced, po_id))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            c = conn.cursor()
+            invoice_id = _insert(c, '''INSERT INTO invoices (po_id, invoice_number, invoice_date, amount, payment_status, created_date)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      (po_id, invoice_number, invoice_date, amount, kwargs.get('payment_status', 'received'),
+                       datetime.now().isoformat()))
+            conn.commit()
         return invoice_id
     
     @staticmethod
-    def get_invoices(po_id: Optional[int] = None, project_id: Optional[int] = None) -> pd.DataFrame:
-        conn = get_connection()
+    def get_invoices(po_id: Optional[int] = None, project_id: Optional[int] = None,
+                     chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
         if po_id:
-            df = pd.read_sql(f"SELECT * FROM invoices WHERE po_id={po_id}", conn)
-        elif project_id:
-            df = pd.read_sql(f"SELECT i.* FROM invoices i JOIN purchase_orders po ON i.po_id = po.id WHERE po.project_id={project_id}", conn)
-        else:
-            df = pd.read_sql("SELECT * FROM invoices", conn)
-        conn.close()
-        return df
+            return _read_sql("SELECT * FROM invoices WHERE po_id=?", (po_id,), chunksize)
+        if project_id:
+            return _read_sql("SELECT i.* FROM invoices i JOIN purchase_orders po ON i.po_id = po.id WHERE po.project_id=?",
+                             (project_id,), chunksize)
+        return _read_sql("SELECT * FROM invoices", (), chunksize)
 
 class TimesheetDB:
     @staticmethod
-    def import_timesheets(project_id: int, df: pd.DataFrame, batch_id: str):
-        conn = get_connection()
-        c = conn.cursor()
-        for _, row in df.iterrows():
-            c.execute('''INSERT INTO timesheets (project_id, date, staff_name, task_name, hours, function,
-                         discipline, rate, cost, week_ending, import_batch_id, import_date)
-                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                      (project_id, row['date'], row['staff_name'], row.get('task_name', ''), row['hours'],
-                       row['function'], row.get('discipline', ''), row['rate'], row['cost'],
-                       row['week_ending'], batch_id, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+    def import_timesheets(project_id: int, df, batch_id: str) -> int:
+        """Insert a DataFrame, or an iterable of DataFrame chunks, as one batch"""
+        frames = [df] if isinstance(df, pd.DataFrame) else df
+        import_date = datetime.now().isoformat()
+        imported = 0
+        with get_connection() as conn:
+            with conn:
+                for frame in frames:
+                    # Arrow-backed chunks carry pd.NA, which sqlite3 cannot bind
+                    frame = frame.astype(object).where(frame.notna(), None)
+                    # Blank and missing optional text both store '' so they group together
+                    for col in ('task_name', 'discipline'):
+                        frame[col] = np.where(frame[col].notna(), frame[col], '') if col in frame else ''
+                    rows = zip(itertools.repeat(project_id), frame['date'], frame['staff_name'],
+                               frame['task_name'], frame['hours'], frame['function'],
+                               frame['discipline'], frame['rate'], frame['cost'],
+                               frame['week_ending'], itertools.repeat(batch_id), itertools.repeat(import_date))
+                    conn.executemany('''INSERT INTO timesheets (project_id, date, staff_name, task_name, hours, function,
+                                        discipline, rate, cost, week_ending, import_batch_id, import_date)
+                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+                    # Roll the chunk into the weekly summary instead of re-grouping the whole project
+                    weekly = (frame.assign(hours=pd.to_numeric(frame['hours']), cost=pd.to_numeric(frame['cost']))
+                              .groupby(['week_ending', 'function', 'discipline'], sort=False)[['hours', 'cost']].sum())
+                    conn.executemany('''INSERT INTO timesheet_weekly_summary (project_id, week_ending, function, discipline, hours, cost)
+                                        VALUES (?, ?, ?, ?, ?, ?)
+                                        ON CONFLICT (project_id, week_ending, function, discipline)
+                                        DO UPDATE SET hours = hours + excluded.hours, cost = cost + excluded.cost''',
+                                     [(project_id, *key, hours, cost) for key, hours, cost in
+                                      zip(weekly.index, weekly['hours'].tolist(), weekly['cost'].tolist())])
+                    imported += len(frame)
+                if imported > DEFER_INDEX_ROWS:
+                    conn.execute("ANALYZE timesheets")
+        return imported
     
     @staticmethod
-    def get_timesheets(project_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
-        conn = get_connection()
-        query = f"SELECT * FROM timesheets WHERE project_id={project_id}"
+    def get_timesheets(project_id: int, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       columns: Optional[List[str]] = None,
+                       chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        query = f"SELECT {_select_list('timesheets', columns)} FROM timesheets WHERE project_id=?"
+        params = [project_id]
         if start_date:
-            query += f" AND date >= '{start_date}'"
+            query += " AND date >= ?"
+            params.append(_ensure_date(start_date))
         if end_date:
-            query += f" AND date <= '{end_date}'"
+            query += " AND date <= ?"
+            params.append(_ensure_date(end_date))
         query += " ORDER BY date"
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        return _read_sql(query, params, chunksize)
     
     @staticmethod
     def get_weekly_summary(project_id: int) -> pd.DataFrame:
-        conn = get_connection()
-        df = pd.read_sql(f"""SELECT week_ending, function, discipline, SUM(hours) as hours, SUM(cost) as cost
-                             FROM timesheets WHERE project_id={project_id}
-                             GROUP BY week_ending, function, discipline ORDER BY week_ending""", conn)
-        conn.close()
+        with get_connection() as conn:
+            df = pd.read_sql("""SELECT week_ending, function, discipline, hours, cost FROM timesheet_weekly_summary
+                                WHERE project_id=? ORDER BY week_ending, function, discipline""", conn, params=(project_id,))
         return df
 
 class ManningDB:
     @staticmethod
     def update_forecast(project_id: int, person_name: str, week_ending: str, forecast_hours: float, position: str, rate: float):
-        conn = get_connection()
-        c = conn.cursor()
-        staff = pd.read_sql(f"SELECT * FROM staff WHERE name='{person_name}'", conn)
-        if staff.empty:
-            return
-        discipline = staff.iloc[0]['discipline']
-        function = staff.iloc[0]['function']
-        c.execute('''INSERT OR REPLACE INTO manning_forecast (project_id, person_name, position, discipline, function,
-                     week_ending, forecast_hours, hourly_rate, forecast_cost, modified_date)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (project_id, person_name, position, discipline, function, week_ending, forecast_hours,
-                   rate, forecast_hours * rate, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        ManningDB.update_forecast_bulk(project_id, [{'person_name': person_name, 'week_ending': week_ending,
+                                                     'forecast_hours': forecast_hours, 'position': position, 'rate': rate}])
+    
+    @staticmethod
+    def update_forecast_bulk(project_id: int, entries) -> int:
+        """Upsert forecast entries (person_name, week_ending, forecast_hours, position, rate) in one transaction"""
+        staff = MasterDataDB.staff_lookup()
+        modified_date = datetime.now().isoformat()
+        rows = []
+        for e in entries:
+            # Unknown staff are skipped, as in a single update
+            if e['person_name'] not in staff:
+                continue
+            discipline, function = staff[e['person_name']]
+            rows.append((project_id, e['person_name'], e['position'], discipline, function, _ensure_date(e['week_ending']),
+                         e['forecast_hours'], e['rate'], e['forecast_hours'] * e['rate'], modified_date))
+        with get_connection() as conn:
+            with conn:
+                conn.executemany('''INSERT OR REPLACE INTO manning_forecast (project_id, person_name, position, discipline, function,
+                                    week_ending, forecast_hours, hourly_rate, forecast_cost, modified_date)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        return len(rows)
     
     @staticmethod
-    def get_manning_forecast(project_id: int, start_week: Optional[str] = None) -> pd.DataFrame:
-        conn = get_connection()
-        query = f"SELECT * FROM manning_forecast WHERE project_id={project_id}"
+    def get_manning_forecast(project_id: int, start_week: Optional[str] = None,
+                             chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+        query = "SELECT * FROM manning_forecast WHERE project_id=?"
+        params = [project_id]
         if start_week:
-            query += f" AND week_ending >= '{start_week}'"
+            query += " AND week_ending >= ?"
+            params.append(_ensure_date(start_week))
         query += " ORDER BY week_ending, person_name"
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        return _read_sql(query, params, chunksize)
     
     @staticmethod
     def get_forecast_reconciliation(project_id: int) -> Dict:
-        conn = get_connection()
-        deliv_ftc = pd.read_sql(f"SELECT SUM(forecast_to_complete) as ftc FROM deliverables WHERE project_id={project_id}", conn).iloc[0]['ftc']
-        manning_ftc = pd.read_sql(f"SELECT SUM(forecast_hours) as ftc FROM manning_forecast WHERE project_id={project_id} AND week_ending > date('now')", conn).iloc[0]['ftc']
-        conn.close()
-        return {'deliverable_ftc': deliv_ftc if deliv_ftc else 0,
-                'manning_ftc': manning_ftc if manning_ftc else 0,
-                'variance': (deliv_ftc if deliv_ftc else 0) - (manning_ftc if manning_ftc else 0)}
+        with get_connection() as conn:
+            deliv_ftc, manning_ftc = conn.execute('''SELECT
+                (SELECT COALESCE(SUM(forecast_to_complete), 0) FROM deliverables WHERE project_id=:pid),
+                (SELECT COALESCE(SUM(forecast_hours), 0) FROM manning_forecast WHERE project_id=:pid AND week_ending > date('now'))''',
+                {'pid': project_id}).fetchone()
+        return {'deliverable_ftc': deliv_ftc,
+                'manning_ftc': manning_ftc,
+                'variance': deliv_ftc - manning_ftc}
 
 class SnapshotDB:
     @staticmethod
     def create_snapshot(project_id: int, week_ending: str):
-        conn = get_connection()
-        c = conn.cursor()
-        project = ProjectDB.get_project(project_id)
-        deliverables = DeliverableDB.get_deliverables(project_id)
-        summary = ProjectDB.get_project_summary(project_id)
-        budget = deliverables['budget_hours'].sum()
-        actuals = TimesheetDB.get_timesheets(project_id)
-        actual_hours = actuals['hours'].sum() if not actuals.empty else 0
-        earned = DeliverableDB.calculate_earned_value(project_id)['earned_hours']
-        ftc = deliverables['forecast_to_complete'].sum()
-        c.execute('''INSERT INTO weekly_snapshots (project_id, snapshot_date, week_ending, project_state,
-                     deliverable_state, forecast_state, budget_hours, actual_hours, earned_hours,
-                     forecast_to_complete, forecast_at_completion, created_by)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (project_id, datetime.now().isoformat(), week_ending, json.dumps(project),
-                   deliverables.to_json(), json.dumps(summary), budget, actual_hours, earned, ftc,
-                   actual_hours + ftc, 'system'))
-        conn.commit()
-        conn.close()
+        SnapshotDB.create_snapshots_bulk([project_id], week_ending)
+    
+    @staticmethod
+    def create_snapshots_bulk(project_ids: List[int], week_ending: str) -> int:
+        """Snapshot several projects with one read per table and one insert batch"""
+        ids = json.dumps([int(pid) for pid in project_ids])
+        snapshot_date = datetime.now().isoformat()
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.row_factory = sqlite3.Row
+            projects = {row['id']: dict(row) for row in
+                        c.execute("SELECT * FROM projects WHERE id IN (SELECT value FROM json_each(?))", (ids,))}
+            deliverables = pd.read_sql("""SELECT * FROM deliverables WHERE project_id IN (SELECT value FROM json_each(?))
+                                          ORDER BY wbs_code""", conn, params=(ids,), dtype=DELIVERABLE_DTYPES)
+            by_function = pd.read_sql("""SELECT project_id, function, SUM(budget_hours) as budget_hours,
+                                         SUM(CASE WHEN manual_progress_override=1 THEN earned_hours ELSE budget_hours * physical_progress / 100.0 END) as earned_hours,
+                                         SUM(forecast_to_complete) as ftc
+                                         FROM deliverables WHERE project_id IN (SELECT value FROM json_each(?))
+                                         GROUP BY project_id, function""", conn, params=(ids,))
+            actuals = pd.read_sql("""SELECT project_id, function, SUM(hours) as actual_hours, SUM(cost) as actual_cost
+                                     FROM timesheets WHERE project_id IN (SELECT value FROM json_each(?))
+                                     GROUP BY project_id, function""", conn, params=(ids,))
+            
+            def per_project(df):
+                groups = {pid: frame.drop(columns='project_id') for pid, frame in df.groupby('project_id')}
+                return lambda pid: groups.get(pid, df.iloc[0:0].drop(columns='project_id'))
+            
+            functions_for, actuals_for = per_project(by_function), per_project(actuals)
+            deliverables_by_project = dict(tuple(deliverables.groupby('project_id')))
+            rows = []
+            for pid, project in projects.items():
+                functions = functions_for(pid)
+                summary = {'budget': functions[['function', 'budget_hours']], 'actuals': actuals_for(pid),
+                           'earned': functions[['function', 'earned_hours']], 'forecast': functions[['function', 'ftc']]}
+                # Totals are sums of the per-function rollup - no further table scans
+                budget = float(summary['budget']['budget_hours'].sum())
+                actual_hours = float(summary['actuals']['actual_hours'].sum())
+                earned = float(summary['earned']['earned_hours'].sum())
+                ftc = float(summary['forecast']['ftc'].sum())
+                # Deliverables go in as a zstd Parquet blob - far smaller and faster to load than JSON
+                deliverable_state = io.BytesIO()
+                project_deliverables = deliverables_by_project.get(pid, deliverables.iloc[0:0])
+                project_deliverables.to_parquet(deliverable_state, compression='zstd', index=False)
+                forecast_state = {key: frame.to_dict('records') for key, frame in summary.items()}
+                rows.append((pid, snapshot_date, week_ending, json.dumps(project), deliverable_state.getvalue(),
+                             json.dumps(forecast_state), budget, actual_hours, earned, ftc, actual_hours + ftc, 'system'))
+            c.executemany('''INSERT INTO weekly_snapshots (project_id, snapshot_date, week_ending, project_state,
+                             deliverable_state, forecast_state, budget_hours, actual_hours, earned_hours,
+                             forecast_to_complete, forecast_at_completion, created_by)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+            conn.commit()
+        return len(rows)
     
     @staticmethod
     def get_snapshots(project_id: int) -> pd.DataFrame:
-        conn = get_connection()
-        df = pd.read_sql(f"SELECT * FROM weekly_snapshots WHERE project_id={project_id} ORDER BY snapshot_date DESC", conn)
-        conn.close()
+        with get_connection() as conn:
+            df = pd.read_sql("SELECT * FROM weekly_snapshots WHERE project_id=? ORDER BY snapshot_date DESC", conn, params=(project_id,))
         return df
+    
+    @staticmethod
+    def get_snapshot_deliverables(snapshot_id: int) -> pd.DataFrame:
+        """Deliverables as they stood when the snapshot was taken"""
+        with get_connection() as conn:
+            row = conn.execute("SELECT deliverable_state FROM weekly_snapshots WHERE id=?", (snapshot_id,)).fetchone()
+        if row is None:
+            return pd.DataFrame()
+        if isinstance(row[0], str):
+            # Older snapshots stored DataFrame.to_json() text
+            return pd.read_json(io.StringIO(row[0]))
+        return pd.read_parquet(io.BytesIO(row[0]))
 
 class CommentaryDB:
     @staticmethod
     def save_commentary(project_id: int, week_ending: str, **kwargs):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO weekly_commentary (project_id, week_ending, key_activities,
-                     next_period_activities, issues_risks, general_notes, schedule_variance_notes,
-                     cost_variance_notes, forecast_change_notes, created_date)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (project_id, week_ending, kwargs.get('key_activities', ''),
-                   kwargs.get('next_period_activities', ''), kwargs.get('issues_risks', ''),
-                   kwargs.get('general_notes', ''), kwargs.get('schedule_variance_notes', ''),
-                   kwargs.get('cost_variance_notes', ''), kwargs.get('forecast_change_notes', ''),
-                   datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        week_ending = _ensure_date(week_ending)
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.execute('''INSERT OR REPLACE INTO weekly_commentary (project_id, week_ending, key_activities,
+                         next_period_activities, issues_risks, general_notes, schedule_variance_notes,
+                         cost_variance_notes, forecast_change_notes, created_date)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                      (project_id, week_ending, kwargs.get('key_activities', ''),
+                       kwargs.get('next_period_activities', ''), kwargs.get('issues_risks', ''),
+                       kwargs.get('general_notes', ''), kwargs.get('schedule_variance_notes', ''),
+                       kwargs.get('cost_variance_notes', ''), kwargs.get('forecast_change_notes', ''),
+                       datetime.now().isoformat()))
+            conn.commit()
     
     @staticmethod
     def get_commentary(project_id: int, week_ending: str) -> Optional[Dict]:
-        conn = get_connection()
-        df = pd.read_sql(f"SELECT * FROM weekly_commentary WHERE project_id={project_id} AND week_ending='{week_ending}'", conn)
-        conn.close()
-        return df.iloc[0].to_dict() if not df.empty else None
+        with get_connection() as conn:
+            c = conn.cursor()
+            c.row_factory = sqlite3.Row
+            row = c.execute("SELECT * FROM weekly_commentary WHERE project_id=? AND week_ending=?",
+                            (project_id, _ensure_date(week_ending))).fetchone()
+        return dict(row) if row else None
 
 class MasterDataDB:
     @staticmethod
     def get_staff() -> pd.DataFrame:
-        conn = get_connection()
-        df = pd.read_sql("SELECT * FROM staff WHERE active=1", conn)
-        conn.close()
+        with get_connection() as conn:
+            df = pd.read_sql("SELECT * FROM staff WHERE active=1", conn)
         return df
     
     @staticmethod
     def get_rates() -> pd.DataFrame:
-        conn = get_connection()
-        df = pd.read_sql("SELECT DISTINCT position, rate FROM rate_schedule WHERE end_date IS NULL OR end_date > date('now') ORDER BY position", conn)
-        conn.close()
+        with get_connection() as conn:
+            df = pd.read_sql("SELECT DISTINCT position, rate FROM rate_schedule WHERE end_date IS NULL OR end_date > date('now') ORDER BY position", conn)
         return df
     
     @staticmethod
     def get_rate_for_position(position: str, as_of_date: Optional[str] = None) -> float:
-        if not as_of_date:
-            as_of_date = datetime.now().strftime('%Y-%m-%d')
-        conn = get_connection()
-        df = pd.read_sql(f"""SELECT rate FROM rate_schedule WHERE position='{position}'
-                             AND effective_date <= '{as_of_date}'
-                             AND (end_date IS NULL OR end_date > '{as_of_date}')
-                             ORDER BY effective_date DESC LIMIT 1""", conn)
-        conn.close()
-        return df.iloc[0]['rate'] if not df.empty else 170.0
-
-try:
-    init_database()
-except Exception as e:
-    print(f"Init error: {e}")
+        as_of_date = _ensure_date(as_of_date) if as_of_date else datetime.now().strftime('%Y-%m-%d')
+        return MasterDataDB._rate_for_position(position, as_of_date)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _rate_for_position(position: str, as_of_date: str) -> float:
+        with get_connection() as conn:
+            row = conn.execute("""SELECT rate FROM rate_schedule WHERE position=?
+                                  AND effective_date <= ?
+                                  AND (end_date IS NULL OR end_date > ?)
+                                  ORDER BY effective_date DESC LIMIT 1""",
+                               (position, as_of_date, as_of_date)).fetchone()
+        return row[0] if row else 170.0
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def staff_lookup() -> Dict:
+        """Staff name -> (discipline, function)"""
+        with get_connection() as conn:
+            rows = conn.execute("SELECT name, discipline, function FROM staff").fetchall()
+        return {name: (discipline, function) for name, discipline, function in rows}
+    
+    @staticmethod
+    def invalidate_caches():
+        """Forget cached staff and rates after staff or rate_schedule edits"""
+        MasterDataDB._rate_for_position.cache_clear()
+        MasterDataDB.staff_lookup.cache_clear()
@@ -272,6 +272,20 @@ CREATE TABLE IF NOT EXISTS timesheets (
     FOREIGN KEY (deliverable_id) REFERENCES deliverables(id)
 );
 
+-- Weekly hours / cost rollup, maintained by the timesheet import and the timesheet triggers
+CREATE TABLE IF NOT EXISTS timesheet_weekly_summary (
+    project_id INTEGER NOT NULL,
+    week_ending TEXT NOT NULL,
+    function TEXT NOT NULL,
+    discipline TEXT NOT NULL,
+    
+    hours REAL NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (project_id, week_ending, function, discipline),
+    FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
 # ============================================================================
 # MANNING FORECAST (Bums on Seats)
 # ============================================================================
@@ -338,7 +352,7 @@ CREATE TABLE IF NOT EXISTS weekly_snapshots (
     
     -- Snapshot data stored as JSON
     project_state TEXT NOT NULL,  -- Full project state
-    deliverable_state TEXT NOT NULL,  -- All deliverables state
+    deliverable_state BLOB NOT NULL,  -- All deliverables state (zstd Parquet)
     forecast_state TEXT NOT NULL,  -- FTC at that time
     
     -- Key metrics at time of snapshot
@@ -415,21 +429,86 @@ INSERT INTO disciplines (code, name, function) VALUES
 # INDEXES FOR PERFORMANCE
 # ============================================================================
 
-CREATE INDEX IF NOT EXISTS idx_deliverables_project ON deliverables(project_id);
+CREATE INDEX IF NOT EXISTS idx_projects_status_date ON projects(status, created_date DESC);
+
+CREATE INDEX IF NOT EXISTS idx_deliverables_project ON deliverables(project_id, wbs_code);
+CREATE INDEX IF NOT EXISTS idx_deliverables_project_function ON deliverables(project_id, function);
 CREATE INDEX IF NOT EXISTS idx_deliverables_discipline ON deliverables(discipline);
 CREATE INDEX IF NOT EXISTS idx_deliverables_function ON deliverables(function);
 
-CREATE INDEX IF NOT EXISTS idx_timesheets_project ON timesheets(project_id);
+CREATE INDEX IF NOT EXISTS idx_timesheets_project_date ON timesheets(project_id, date);
+CREATE INDEX IF NOT EXISTS idx_timesheets_project_week_group ON timesheets(project_id, week_ending, function, discipline);
+CREATE INDEX IF NOT EXISTS idx_timesheets_project_function ON timesheets(project_id, function);
 CREATE INDEX IF NOT EXISTS idx_timesheets_week ON timesheets(week_ending);
 CREATE INDEX IF NOT EXISTS idx_timesheets_deliverable ON timesheets(deliverable_id);
 
-CREATE INDEX IF NOT EXISTS idx_manning_project ON manning_forecast(project_id);
+CREATE INDEX IF NOT EXISTS idx_manning_project_week ON manning_forecast(project_id, week_ending);
 CREATE INDEX IF NOT EXISTS idx_manning_week ON manning_forecast(week_ending);
 
-CREATE INDEX IF NOT EXISTS idx_change_orders_project ON change_orders(project_id);
+CREATE INDEX IF NOT EXISTS idx_change_orders_project ON change_orders(project_id, created_date);
 CREATE INDEX IF NOT EXISTS idx_pos_project ON purchase_orders(project_id);
+CREATE INDEX IF NOT EXISTS idx_invoices_po ON invoices(po_id);
+
+# ============================================================================
+# TRIGGERS
+# ============================================================================
 
-CREATE INDEX IF NOT EXISTS idx_snapshots_project_date ON weekly_snapshots(project_id, snapshot_date);
+-- Invoices apply their own delta to the PO's invoiced_to_date
+CREATE TRIGGER IF NOT EXISTS trg_invoices_insert AFTER INSERT ON invoices BEGIN
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) + NEW.amount WHERE id = NEW.po_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_invoices_update AFTER UPDATE OF po_id, amount ON invoices BEGIN
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) - OLD.amount WHERE id = OLD.po_id;
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) + NEW.amount WHERE id = NEW.po_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_invoices_delete AFTER DELETE ON invoices BEGIN
+    UPDATE purchase_orders SET invoiced_to_date = COALESCE(invoiced_to_date, 0) - OLD.amount WHERE id = OLD.po_id;
+END;
+
+-- Any change to a PO's commitment, invoiced or accrued amounts recomputes remaining_commitment
+CREATE TRIGGER IF NOT EXISTS trg_pos_remaining_insert AFTER INSERT ON purchase_orders BEGIN
+    UPDATE purchase_orders
+    SET remaining_commitment = commitment_value - COALESCE(invoiced_to_date, 0) - COALESCE(accrued_work_done, 0)
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pos_remaining_update
+AFTER UPDATE OF commitment_value, invoiced_to_date, accrued_work_done ON purchase_orders BEGIN
+    UPDATE purchase_orders
+    SET remaining_commitment = commitment_value - COALESCE(invoiced_to_date, 0) - COALESCE(accrued_work_done, 0)
+    WHERE id = NEW.id;
+END;
+
+-- Timesheet rows are only inserted by import_timesheets, which rolls each chunk into timesheet_weekly_summary.
+-- Edits and deletes (including project deletes) are kept current here; a key with no timesheets left is removed.
+CREATE TRIGGER IF NOT EXISTS trg_timesheets_summary_update
+AFTER UPDATE OF project_id, week_ending, function, discipline, hours, cost ON timesheets BEGIN
+    UPDATE timesheet_weekly_summary SET hours = hours - OLD.hours, cost = cost - OLD.cost
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '');
+    DELETE FROM timesheet_weekly_summary
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '')
+    AND NOT EXISTS (SELECT 1 FROM timesheets WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+                    AND function = OLD.function AND COALESCE(discipline, '') = COALESCE(OLD.discipline, ''));
+    INSERT INTO timesheet_weekly_summary (project_id, week_ending, function, discipline, hours, cost)
+    VALUES (NEW.project_id, NEW.week_ending, NEW.function, COALESCE(NEW.discipline, ''), NEW.hours, NEW.cost)
+    ON CONFLICT (project_id, week_ending, function, discipline)
+    DO UPDATE SET hours = hours + excluded.hours, cost = cost + excluded.cost;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_timesheets_summary_delete AFTER DELETE ON timesheets BEGIN
+    UPDATE timesheet_weekly_summary SET hours = hours - OLD.hours, cost = cost - OLD.cost
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '');
+    DELETE FROM timesheet_weekly_summary
+    WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+    AND function = OLD.function AND discipline = COALESCE(OLD.discipline, '')
+    AND NOT EXISTS (SELECT 1 FROM timesheets WHERE project_id = OLD.project_id AND week_ending = OLD.week_ending
+                    AND function = OLD.function AND COALESCE(discipline, '') = COALESCE(OLD.discipline, ''));
+END;
 
 # ============================================================================
 # VIEWS FOR COMMON QUERIES